@@ -5,6 +5,8 @@ API_HASH = getenv("API_HASH", "fa3c15f5ed4e3226ce9a929e4b9b2806")
 BOT_TOKEN = getenv("BOT_TOKEN", "")
 OWNER_ID = list(map(int, getenv("OWNER_ID", "922270982").split()))
 MONGO_DB = getenv("MONGO_DB", "")
+# Connections the shared MongoDB client may open
+MONGO_POOL_SIZE = int(getenv("MONGO_POOL_SIZE", "20"))
 LOG_GROUP = getenv("LOG_GROUP", "-1002293309406")
 CHANNEL_ID = int(getenv("CHANNEL_ID", "-1002433933366"))
 FREEMIUM_LIMIT = int(getenv("FREEMIUM_LIMIT", "20"))
@@ -14,6 +16,47 @@ AD_API = getenv("AD_API", None)
 STRING = getenv("STRING", None)
 YT_COOKIES = getenv("YT_COOKIES", None)
 INSTA_COOKIES = getenv("INSTA_COOKIES", None)
+# Relay media from the userbot download straight into the upload without a temp file
+STREAM_RELAY = getenv("STREAM_RELAY", "True").lower() == "true"
+# Messages of one /batch processed at the same time (shrinks on FloodWait, grows back up to the max)
+BATCH_CONCURRENCY = int(getenv("BATCH_CONCURRENCY", "3"))
+BATCH_MAX_CONCURRENCY = int(getenv("BATCH_MAX_CONCURRENCY", "6"))
+# Process role: "all" does everything in one process, "front" receives updates and queues jobs,
+# "worker" only runs queued jobs (start one per core, on as many machines as needed)
+ROLE = getenv("ROLE", "all").lower()
+# Tells worker processes apart so each one keeps session files of its own
+# (unset: hostname and pid, which is unique but leaves a new session file per restart)
+WORKER_ID = getenv("WORKER_ID", getenv("DYNO"))
+# Queued save jobs run at the same time, and messages a batch sends before making way for other users
+JOB_WORKERS = int(getenv("JOB_WORKERS", "8"))
+JOB_BATCH_SLICE = int(getenv("JOB_BATCH_SLICE", "20"))
+# Userbot sessions kept connected on this node, and seconds before an idle one is stopped
+USERBOT_POOL_SIZE = int(getenv("USERBOT_POOL_SIZE", "50"))
+USERBOT_IDLE_TIMEOUT = int(getenv("USERBOT_IDLE_TIMEOUT", "600"))
+# Seconds a cached premium/token lookup is trusted before it is re-read from MongoDB
+PREMIUM_CACHE_TTL = int(getenv("PREMIUM_CACHE_TTL", "300"))
+# Seconds cached user settings are trusted; local writes invalidate them immediately
+SETTINGS_CACHE_TTL = int(getenv("SETTINGS_CACHE_TTL", "300"))
+# How often (seconds) each process picks up cache entries another process changed (settings, premium, ...)
+CACHE_SYNC_INTERVAL = int(getenv("CACHE_SYNC_INTERVAL", "2"))
+# How often (seconds) each node checks whether another node locked a channel
+LOCK_SYNC_INTERVAL = int(getenv("LOCK_SYNC_INTERVAL", "30"))
+# Processes for CPU-bound media work (hashing, tagging); callers beyond what they can take wait their turn
+MEDIA_WORKERS = int(getenv("MEDIA_WORKERS", "2"))
+# ffmpeg thumbnail grabs allowed to run at the same time
+THUMB_WORKERS = int(getenv("THUMB_WORKERS", "2"))
+# Uploads remembered by file id so repeated saves of the same media skip the download
+FILE_CACHE_SIZE = int(getenv("FILE_CACHE_SIZE", "5000"))
+FILE_CACHE_TTL = int(getenv("FILE_CACHE_TTL", "86400"))
+# Request limits: per chat per minute, per userbot session per minute, and bot-wide per second
+RATE_LIMIT_CHAT = int(getenv("RATE_LIMIT_CHAT", "15"))
+RATE_LIMIT_SESSION = int(getenv("RATE_LIMIT_SESSION", "60"))
+RATE_LIMIT_GLOBAL = int(getenv("RATE_LIMIT_GLOBAL", "30"))
+# Broadcasts: messages per second (kept under the global limit so commands still get through) and sends in flight
+BROADCAST_RATE = int(getenv("BROADCAST_RATE", "25"))
+BROADCAST_WORKERS = int(getenv("BROADCAST_WORKERS", "10"))
+# Minimum seconds between two progress edits of the same message
+PROGRESS_EDIT_INTERVAL = int(getenv("PROGRESS_EDIT_INTERVAL", "5"))
 # FloodWait handling settings
 # Set to a reasonable value that balances between retrying too quickly (causing more FloodWait)
 # and waiting too long (causing user experience issues)
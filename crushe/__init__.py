@@ -1,12 +1,19 @@
 #crushe
 import asyncio
 import logging
+import os
+import socket
 import time
 from pyromod import listen
 from pyrogram import Client
-from config import API_ID, API_HASH, BOT_TOKEN, STRING, MONGO_DB, SECONDS
+from config import API_ID, API_HASH, BOT_TOKEN, STRING, SECONDS, ROLE, WORKER_ID
 from telethon.sync import TelegramClient
-from motor.motor_asyncio import AsyncIOMotorClient
+from crushe.core.mongo.client import mongo
+from crushe.core.mongo.users_db import create_user_index
+from crushe.core.mongo.settings_db import create_settings_index
+from crushe.core.flood import FloodScheduler
+from crushe.core.media_stage import MediaStage
+import tricky
 
 # Configure logging
 loop = asyncio.get_event_loop()
@@ -22,31 +29,46 @@ logging.getLogger("pyrogram.connection").setLevel(logging.ERROR)
 # Silence empty message warnings
 logging.getLogger("pyrogram.types.messages_and_media.message").setLevel(logging.ERROR)
 
+# Workers share the bot token with the front process but never take updates,
+# so each of them signs in with sessions of its own
+IS_WORKER = ROLE == "worker"
+if IS_WORKER and not WORKER_ID:
+    # Two workers sharing a session file would clobber each other's auth keys
+    WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+    logging.warning(f"WORKER_ID is not set, using {WORKER_ID}")
+SESSION_SUFFIX = f"-worker{WORKER_ID}" if IS_WORKER else ""
+
 app = Client(
-    "RestrictBot",
+    "RestrictBot" + SESSION_SUFFIX,
     api_id=API_ID,
     api_hash=API_HASH,
     bot_token=BOT_TOKEN,
     workers=10,
-    no_updates=False,               # Ensure updates are received
+    no_updates=IS_WORKER,           # Only the front process receives updates
     workdir="./"                    # Specify working directory for session files
 )
 
 botStartTime = time.time()
 pro = Client(
-    "ggbot", 
+    "ggbot" + SESSION_SUFFIX, 
     api_id=API_ID, 
     api_hash=API_HASH, 
     session_string=STRING,
-    no_updates=False,               # Ensure updates are received
+    no_updates=IS_WORKER,
     workdir="./"                    # Specify working directory for session files
 )
-sex = TelegramClient('sexrepo', API_ID, API_HASH).start(bot_token=BOT_TOKEN)
+sex = TelegramClient('sexrepo' + SESSION_SUFFIX, API_ID, API_HASH, receive_updates=not IS_WORKER).start(bot_token=BOT_TOKEN)
+
+# FloodWaits hit by any client block the method for every caller
+for client in (app, pro, sex):
+    FloodScheduler.install(client)
+
+# The uploader's MD5 hashing goes through the media process pool
+tricky.offload = MediaStage.run
 
 
 # MongoDB setup
-tclient = AsyncIOMotorClient(MONGO_DB)
-tdb = tclient["telegram_bot"]  # Your database
+tdb = mongo["telegram_bot"]  # Your database
 token = tdb["tokens"]  # Your tokens collection
 
 async def create_ttl_index():
@@ -57,6 +79,8 @@ async def create_ttl_index():
 async def setup_database():
     await create_ttl_index()
     print("MongoDB TTL index created.")
+    await create_user_index()
+    await create_settings_index()
 
 # You can call this in your main bot file before starting the bot
 
@@ -3,12 +3,19 @@ import asyncio
 import importlib
 import logging
 from pyrogram import idle
+from crushe import app
 from crushe.modules import ALL_MODULES
 from aiojobs import create_scheduler
 from crushe.core.mongo.plans_db import check_and_remove_expired_users
+from crushe.core.session_pool import UserbotPool
+from crushe.core.cache import run_sweeper as run_cache_sweeper
+from crushe.core.mongo.cache_sync import run_cache_sync
+from crushe.core.broadcast import resume_broadcasts
+from crushe.core.jobs import JobQueue
+from crushe.core.mongo.settings_db import load_locked_channels, run_lock_sync
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from config import SECONDS
+from config import SECONDS, ROLE
 
 # Configure more detailed logging for error tracking
 logging.basicConfig(
@@ -33,10 +40,27 @@ async def schedule_expiry_check():
 async def crushe_boot():
     for all_module in ALL_MODULES:
         importlib.import_module("crushe.modules." + all_module)
-    print("Bot deployed by Crushe...🎉")
+    print(f"Bot deployed by Crushe...🎉 ({ROLE})")
 
-    # Start the background task for checking expired users
-    asyncio.create_task(schedule_expiry_check())
+    # Protected channels are checked in memory on every link
+    await load_locked_channels()
+    asyncio.create_task(run_lock_sync())
+
+    # Stop pooled userbots that have gone idle
+    asyncio.create_task(UserbotPool.run_sweeper())
+    # Drop expired entries from the in-memory caches
+    asyncio.create_task(run_cache_sweeper())
+    # Apply cache invalidations published by the other processes
+    asyncio.create_task(run_cache_sync())
+
+    if ROLE != "worker":
+        # Start the background task for checking expired users
+        asyncio.create_task(schedule_expiry_check())
+        # Pick up broadcasts interrupted by a restart
+        await resume_broadcasts(app)
+    if ROLE != "front":
+        # Drain queued save jobs, including the ones left over from before a restart
+        await JobQueue.run_workers()
     # Keep the bot running
     await idle()
     print("Lol ...")
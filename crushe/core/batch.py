@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from config import BATCH_CONCURRENCY
+from crushe.core.flood import FloodScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """Runs the messages of one batch concurrently while keeping their output in order.
+
+    Every job gets a sequence number. Jobs download in parallel, but a job only
+    sends its output once ``wait_turn`` says every earlier job has finished.
+    The number of jobs in flight shrinks on FloodWait and slowly grows back
+    after a run of clean completions (additive increase, multiplicative decrease).
+    Every job listens on the FloodScheduler, so floods its requests wait out count too.
+    """
+
+    def __init__(self, concurrency: int = BATCH_CONCURRENCY, max_concurrency: Optional[int] = None):
+        self.limit = max(1, concurrency)
+        self.max_limit = max(self.limit, max_concurrency or self.limit)
+        self.completed = 0
+        # seq -> error of every job that raised, so the caller can retry or report them
+        self.failed: Dict[int, Exception] = {}
+        self._running = 0
+        self._next_seq = 0
+        self._finished = set()
+        self._clean_streak = 0
+        # Floods before this monotonic time belong to the last cut and do not halve the limit again
+        self._flood_until = 0.0
+        self._cond = asyncio.Condition()
+
+    async def wait_turn(self, seq: int):
+        """Block until every job before ``seq`` has finished."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._next_seq >= seq)
+
+    def on_flood_wait(self, wait_time: float):
+        """Flood listener of every job: halve the number of jobs in flight."""
+        self._clean_streak = 0
+        now = time.monotonic()
+        if now < self._flood_until:
+            return
+        self._flood_until = now + (wait_time if isinstance(wait_time, (int, float)) else 1)
+        new_limit = max(1, self.limit // 2)
+        if new_limit != self.limit:
+            logger.warning(f"FloodWait of {wait_time}s in batch, concurrency {self.limit} -> {new_limit}")
+        self.limit = new_limit
+
+    async def _acquire_slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._running < self.limit)
+            self._running += 1
+
+    async def _complete(self, seq: int, clean: bool):
+        async with self._cond:
+            self._running -= 1
+            self.completed += 1
+            self._finished.add(seq)
+            while self._next_seq in self._finished:
+                self._finished.remove(self._next_seq)
+                self._next_seq += 1
+            if clean:
+                self._clean_streak += 1
+            if self._clean_streak >= self.limit * 2 and self.limit < self.max_limit:
+                self.limit += 1
+                self._clean_streak = 0
+            self._cond.notify_all()
+
+    async def _run_job(self, seq: int, job: Callable[[Callable[[], Awaitable[None]]], Awaitable[None]]):
+        # Runs in a task of its own, so the listener only hears this job's floods
+        FloodScheduler.listen(self.on_flood_wait)
+        clean = False
+        try:
+            await job(lambda: self.wait_turn(seq))
+            clean = True
+        except Exception as e:
+            logger.error(f"Batch job {seq} failed: {str(e)}")
+            self.failed[seq] = e
+        finally:
+            await self._complete(seq, clean)
+
+    async def run(self, jobs: Iterable[Callable[[Callable[[], Awaitable[None]]], Awaitable[None]]],
+                  should_continue: Callable[[], bool] = lambda: True):
+        """Run ``jobs`` in order of their sequence numbers.
+
+        Each job is called with a ``turn`` coroutine function that it must await
+        before sending anything to the user. Jobs are started in order, so the
+        oldest unfinished job always holds a slot and the batch cannot deadlock.
+        """
+        tasks = []
+        for seq, job in enumerate(jobs):
+            await self._acquire_slot()
+            if not should_continue():
+                async with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+                break
+            tasks.append(asyncio.create_task(self._run_job(seq, job)))
+        await asyncio.gather(*tasks)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, UserDeactivated, PeerIdInvalid
+from config import BROADCAST_RATE, BROADCAST_WORKERS
+from crushe.core.flood import FloodScheduler
+from crushe.core.progress import ProgressService
+from crushe.core.rate_limit import RateLimiter, bot_limiter, reserve
+from crushe.core.mongo.users_db import iter_active_users, mark_inactive
+from crushe.core.mongo.broadcast_db import save_checkpoint, get_running_broadcasts
+
+logger = logging.getLogger(__name__)
+
+# Paces every broadcast together; bot_limiter is reserved as well so the bot-wide budget still holds
+broadcast_limiter = RateLimiter(rate=BROADCAST_RATE, period=1.0, burst=BROADCAST_RATE, name="rate_broadcast")
+
+
+def broadcast_text(done, failed, inactive, total=None, finished=False):
+    if finished:
+        text = f"**sᴜᴄᴄᴇssғᴜʟʟʏ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ ✅**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done}` **ᴜsᴇʀs**"
+    else:
+        text = f"**ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ...**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done}` / `{total}` **ᴜsᴇʀs**"
+    if inactive:
+        text += f"\n\n**ʙʟᴏᴄᴋᴇᴅ / ᴅᴇʟᴇᴛᴇᴅ:** `{inactive}` **ᴜsᴇʀs** (sᴋɪᴘᴘᴇᴅ ɴᴇxᴛ ᴛɪᴍᴇ)"
+    if failed:
+        text += f"\n\n**ɴᴏᴛᴇ:-** `ᴅᴜᴇ ᴛᴏ sᴏᴍᴇ ɪssᴜᴇ ᴄᴀɴ'ᴛ ᴀʙʟᴇ ᴛᴏ ʙʀᴏᴀᴅᴄᴀsᴛ` `{failed}` **ᴜsᴇʀs**"
+    return text
+
+
+class Broadcast:
+    """Sends one message to every active user.
+
+    User ids are streamed from MongoDB in ascending order and handed to a small pool of
+    workers, paced at BROADCAST_RATE. The highest id below which every user has been handled
+    is checkpointed, so a restart picks up from there (users past it may get the message twice).
+    Users who blocked the bot or deleted their account are marked and skipped from then on.
+    """
+
+    # Checkpoint after this many users, or this many seconds, whichever comes first
+    CHECKPOINT_EVERY = 200
+    CHECKPOINT_INTERVAL = 10
+
+    def __init__(self, client: Any, doc: Dict[str, Any], status_message: Optional[Any] = None):
+        self.client = client
+        self.doc = doc
+        self.status_message = status_message
+        self.done = doc.get("done", 0)
+        self.failed = doc.get("failed", 0)
+        self.inactive = doc.get("inactive", 0)
+        self._last_user = doc.get("last_user", 0)
+        # Ids in the order they were handed out, with whether they are finished yet
+        self._pending = deque()
+        self._finished = set()
+        self._since_checkpoint = 0
+        self._checkpoint_at = time.monotonic()
+
+    async def _send(self, user_id: int):
+        if self.doc["mode"] == "forward":
+            await self.client.forward_messages(
+                chat_id=user_id, from_chat_id=self.doc["from_chat_id"], message_ids=self.doc["message_id"]
+            )
+        else:
+            await self.client.copy_message(
+                chat_id=user_id, from_chat_id=self.doc["from_chat_id"], message_id=self.doc["message_id"]
+            )
+
+    async def _deliver(self, user_id: int):
+        while True:
+            wait = reserve((broadcast_limiter, "broadcast"), (bot_limiter, "bot"))
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                await self._send(user_id)
+                self.done += 1
+                return
+            except FloodWait as e:
+                await FloodScheduler.after_flood(e, e.value)
+            except (InputUserDeactivated, UserDeactivated):
+                await mark_inactive(user_id, "deactivated")
+                self.inactive += 1
+                return
+            except UserIsBlocked:
+                await mark_inactive(user_id, "blocked")
+                self.inactive += 1
+                return
+            except PeerIdInvalid:
+                self.failed += 1
+                return
+            except Exception as e:
+                logger.warning(f"Broadcast to {user_id} failed: {str(e)}")
+                self.failed += 1
+                return
+
+    async def _worker(self, queue: asyncio.Queue):
+        FloodScheduler.set_priority(FloodScheduler.PRIORITY_LOW)
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            await self._deliver(user_id)
+            self._finished.add(user_id)
+            await self._advance()
+
+    async def _advance(self):
+        # Move the checkpoint over every id that is finished along with all ids before it
+        while self._pending and self._pending[0] in self._finished:
+            self._last_user = self._pending.popleft()
+            self._finished.discard(self._last_user)
+        self._since_checkpoint += 1
+        if (self._since_checkpoint >= self.CHECKPOINT_EVERY
+                or time.monotonic() - self._checkpoint_at >= self.CHECKPOINT_INTERVAL):
+            await self._checkpoint()
+        if self.status_message:
+            ProgressService.report(self.status_message, self.handled, self.doc["total"], self._render)
+
+    @property
+    def handled(self) -> int:
+        return self.done + self.failed + self.inactive
+
+    def _render(self, current, total):
+        return broadcast_text(self.done, self.failed, self.inactive, total)
+
+    async def _checkpoint(self, status: str = "running"):
+        self._since_checkpoint = 0
+        self._checkpoint_at = time.monotonic()
+        try:
+            await save_checkpoint(self.doc["_id"], self._last_user, self.done, self.failed, self.inactive, status)
+        except Exception as e:
+            logger.warning(f"Could not checkpoint broadcast {self.doc['_id']}: {str(e)}")
+
+    async def run(self):
+        queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(BROADCAST_WORKERS)]
+        try:
+            async for user_id in iter_active_users(after=self._last_user):
+                self._pending.append(user_id)
+                await queue.put(user_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            await self._checkpoint()
+            raise
+
+        await self._checkpoint(status="finished")
+        if self.status_message:
+            ProgressService.finish(self.status_message)
+            try:
+                await self.status_message.edit_text(
+                    broadcast_text(self.done, self.failed, self.inactive, finished=True)
+                )
+            except Exception as e:
+                logger.debug(f"Broadcast status edit skipped: {str(e)}")
+        logger.info(f"Broadcast {self.doc['_id']} finished: {self.done} sent, "
+                    f"{self.inactive} inactive, {self.failed} failed")
+
+
+async def resume_broadcasts(client: Any):
+    """Continue the broadcasts that were still running when the bot stopped."""
+    for doc in await get_running_broadcasts():
+        status_message = None
+        try:
+            status_message = await client.get_messages(doc["status_chat_id"], doc["status_message_id"])
+        except Exception:
+            pass
+        logger.info(f"Resuming broadcast {doc['_id']} after user {doc['last_user']}")
+        asyncio.create_task(Broadcast(client, doc, status_message).run())
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# name -> cache, for the background sweeper and /stats
+_registry: Dict[str, "TTLCache"] = {}
+
+
+def _sizeof(obj: Any) -> int:
+    """Approximate size in bytes: the object plus its direct items for containers."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in obj)
+    return size
+
+
+class TTLCache:
+    """In-process map with per-entry expiry and a size cap (least recently used entries go first).
+
+    ``can_evict`` lets a cache keep entries that are still in use (for example held locks)
+    past their expiry and past ``maxsize``. Caches created with a ``name`` are swept by
+    ``run_sweeper`` and reported by ``cache_stats``.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, name: Optional[str] = None,
+                 can_evict: Optional[Callable[[Any], bool]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.can_evict = can_evict
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (expires_at, value); expires_at is None for entries that never expire
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        if name:
+            _registry[name] = self
+
+    def _evictable(self, value: Any) -> bool:
+        return self.can_evict is None or self.can_evict(value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic() and self._evictable(value):
+            del self._data[key]
+            self.expirations += 1
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store ``value``; ``ttl`` overrides the cache-wide default for this entry."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._shrink()
+
+    def _shrink(self):
+        """Drop least recently used entries until the cache fits, skipping ones still in use."""
+        excess = len(self._data) - self.maxsize
+        for key in list(self._data):
+            if excess <= 0:
+                break
+            if self._evictable(self._data[key][1]):
+                del self._data[key]
+                self.evictions += 1
+                excess -= 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def sweep(self) -> int:
+        """Remove every expired entry. Returns how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, value) in self._data.items()
+                   if expires_at is not None and expires_at <= now and self._evictable(value)]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Iterate over live entries without refreshing their recency."""
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at is None or expires_at > now or not self._evictable(value):
+                yield key, value
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by keys and values."""
+        return sys.getsizeof(self._data) + sum(_sizeof(key) + _sizeof(value) for key, (_, value) in self._data.items())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.memory_usage(),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Size and memory of every named cache."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+async def run_sweeper(interval: float = 60):
+    """Background task that drops expired entries from every named cache."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = sum(cache.sweep() for cache in list(_registry.values()))
+            if removed:
+                total = sum(cache.memory_usage() for cache in list(_registry.values()))
+                logger.info(f"Swept {removed} expired cache entries, ~{total / 1024**2:.1f} MB still cached")
+        except Exception as e:
+            logger.error(f"Error sweeping caches: {str(e)}")
@@ -1,115 +1,89 @@
 import asyncio
 import logging
-import random
-import time
-from typing import Dict, Any, Optional, List, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from config import RATE_LIMIT_CHAT, RATE_LIMIT_SESSION, RATE_LIMIT_GLOBAL
+from crushe.core.cache import TTLCache
+from crushe.core.rate_limit import RateLimiter, bot_limiter, reserve
 
 logger = logging.getLogger(__name__)
 
+
+def _lock_idle(lock: asyncio.Lock) -> bool:
+    # A released lock can still have a waiter about to take it over
+    return not lock.locked() and not getattr(lock, "_waiters", None)
+
+
 class ConnectionManager:
     """Manages connections to prevent too many concurrent requests to the same resource."""
     
-    # Dictionary to store locks for different connections
-    _connection_locks: Dict[str, asyncio.Lock] = {}
+    # Cache expiration time (in seconds)
+    CACHE_EXPIRY = 3600  # 1 hour
     
-    # Dictionary to store message cache
-    _message_cache: Dict[str, Dict[str, Any]] = {}
+    # Locks for different connections; only idle locks are ever evicted
+    _connection_locks = TTLCache(maxsize=5000, ttl=600, name="connection_locks", can_evict=_lock_idle)
     
-    # Dictionary to store last edited message content
-    _last_edit_content: Dict[str, str] = {}
+    # Message cache
+    _message_cache = TTLCache(maxsize=2000, ttl=CACHE_EXPIRY, name="message_cache")
     
-    # Cache expiration time (in seconds)
-    CACHE_EXPIRY = 3600  # 1 hour
+    # Last edited message content
+    _last_edit_content = TTLCache(maxsize=10000, ttl=CACHE_EXPIRY, name="last_edit_content")
     
     # Maximum number of concurrent connections per chat
     MAX_CONCURRENT_CONNECTIONS = 2  # Reduced from 3 to avoid hitting limits
     
-    # Rate limiting settings
-    _request_timestamps: Dict[str, List[datetime]] = {}
-    MAX_REQUESTS_PER_MINUTE = 15  # Reduced from 20 to be more conservative
+    # Rate limiting settings: per chat, and per userbot session both per minute and per second.
+    # Userbots are separate accounts, so their fetches never spend the bot's own budget
+    MAX_REQUESTS_PER_MINUTE = RATE_LIMIT_CHAT
+    _chat_limiter = RateLimiter(rate=RATE_LIMIT_CHAT, period=60, burst=5, name="rate_chat")
+    _session_limiter = RateLimiter(rate=RATE_LIMIT_SESSION, period=60, burst=10, name="rate_session")
+    _client_limiter = RateLimiter(rate=RATE_LIMIT_GLOBAL, period=1.0, burst=RATE_LIMIT_GLOBAL, name="rate_client")
     
     # Connection pool management
     _active_connections: Dict[str, int] = {}
-    _last_connection_time: Dict[str, float] = {}
-    MIN_CONNECTION_INTERVAL = 1.0  # Minimum time between connections in seconds
     
     @classmethod
-    async def with_connection_lock(cls, connection_id: str, coro):
-        """Execute a coroutine with a connection lock to prevent too many concurrent requests."""
-        # Check rate limits first
-        await cls._check_rate_limit(connection_id)
+    async def with_connection_lock(cls, connection_id: str, coro, session: Optional[Any] = None):
+        """Execute a coroutine with a connection lock to prevent too many concurrent requests.
         
-        # Check connection interval to avoid rapid connections
-        await cls._check_connection_interval(connection_id)
+        ``session`` identifies the userbot making the request, so its requests across
+        all chats share one budget.
+        """
+        # Check rate limits first
+        await cls._check_rate_limit(connection_id, session)
         
         # Get or create a lock for this connection
-        if connection_id not in cls._connection_locks:
-            cls._connection_locks[connection_id] = asyncio.Lock()
+        lock = cls._connection_locks.get(connection_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            cls._connection_locks.set(connection_id, lock)
         
         # Track active connections
         cls._increment_active_connections(connection_id)
         
         try:
             # Acquire the lock and execute the coroutine
-            async with cls._connection_locks[connection_id]:
-                # Add a small delay to space out requests
-                await asyncio.sleep(0.5)
+            async with lock:
                 return await coro
         finally:
             # Always decrement active connections count
             cls._decrement_active_connections(connection_id)
     
     @classmethod
-    async def _check_rate_limit(cls, connection_id: str):
-        """Check if the rate limit has been exceeded for this connection."""
-        now = datetime.now()
-        minute_ago = now - timedelta(minutes=1)
-        
-        # Initialize timestamps list if not exists
-        if connection_id not in cls._request_timestamps:
-            cls._request_timestamps[connection_id] = []
-        
-        # Remove timestamps older than 1 minute
-        cls._request_timestamps[connection_id] = [
-            ts for ts in cls._request_timestamps[connection_id] if ts > minute_ago
-        ]
-        
-        # Check if rate limit exceeded
-        if len(cls._request_timestamps[connection_id]) >= cls.MAX_REQUESTS_PER_MINUTE:
-            # Calculate wait time based on oldest request
-            wait_time = (cls._request_timestamps[connection_id][0] + timedelta(minutes=1) - now).total_seconds()
-            
-            # Ensure wait time is positive
-            wait_time = max(wait_time, 1.0)
-            
-            # Add jitter to avoid thundering herd problem
-            jitter = wait_time * 0.1  # 10% jitter
-            wait_time += random.uniform(0, jitter)
-            
-            logger.warning(f"Rate limit exceeded for {connection_id}. Waiting {wait_time:.2f} seconds.")
-            await asyncio.sleep(wait_time + 1)  # Add 1 second buffer
-            
-            # Recursive check after waiting to ensure we're under the limit
-            return await cls._check_rate_limit(connection_id)
-        
-        # Add current timestamp
-        cls._request_timestamps[connection_id].append(now)
-    
-    @classmethod
-    async def _check_connection_interval(cls, connection_id: str):
-        """Ensure minimum time between connections to the same resource."""
-        current_time = time.time()
-        
-        if connection_id in cls._last_connection_time:
-            elapsed = current_time - cls._last_connection_time[connection_id]
-            if elapsed < cls.MIN_CONNECTION_INTERVAL:
-                wait_time = cls.MIN_CONNECTION_INTERVAL - elapsed
-                logger.debug(f"Spacing connections for {connection_id}. Waiting {wait_time:.2f} seconds.")
-                await asyncio.sleep(wait_time)
-        
-        # Update last connection time
-        cls._last_connection_time[connection_id] = time.time()
+    async def _check_rate_limit(cls, connection_id: str, session: Optional[Any] = None):
+        """Wait until the chat limit and the limits of the account making the request allow another one.
+
+        Requests without a ``session`` are the bot's own and count against ``bot_limiter``.
+        """
+        limits = [(cls._chat_limiter, connection_id)]
+        if session is None:
+            limits.append((bot_limiter, "bot"))
+        else:
+            limits.extend(((cls._session_limiter, session), (cls._client_limiter, session)))
+        wait_time = reserve(*limits)
+        if wait_time > 0:
+            logger.debug(f"Rate limiting {connection_id}. Waiting {wait_time:.2f} seconds.")
+            await asyncio.sleep(wait_time)
     
     @classmethod
     def _increment_active_connections(cls, connection_id: str):
@@ -126,27 +100,19 @@ class ConnectionManager:
         if connection_id in cls._active_connections and cls._active_connections[connection_id] > 0:
             cls._active_connections[connection_id] -= 1
             logger.debug(f"Active connections for {connection_id}: {cls._active_connections[connection_id]}")
+            if cls._active_connections[connection_id] == 0:
+                del cls._active_connections[connection_id]
 
     
     @classmethod
     async def cache_message(cls, cache_key: str, message):
         """Cache a message for future use."""
-        cls._message_cache[cache_key] = {
-            'message': message,
-            'expires_at': datetime.now() + timedelta(seconds=cls.CACHE_EXPIRY)
-        }
+        cls._message_cache.set(cache_key, message)
     
     @classmethod
     async def get_cached_message(cls, cache_key: str) -> Optional[Any]:
         """Get a cached message if it exists and hasn't expired."""
-        if cache_key in cls._message_cache:
-            cache_entry = cls._message_cache[cache_key]
-            if datetime.now() < cache_entry['expires_at']:
-                return cache_entry['message']
-            else:
-                # Remove expired cache entry
-                del cls._message_cache[cache_key]
-        return None
+        return cls._message_cache.get(cache_key)
     
     @classmethod
     def clear_cache(cls):
@@ -156,13 +122,7 @@ class ConnectionManager:
     @classmethod
     def clear_expired_cache(cls):
         """Clear expired cache entries."""
-        now = datetime.now()
-        keys_to_delete = [
-            key for key, entry in cls._message_cache.items() 
-            if now > entry['expires_at']
-        ]
-        for key in keys_to_delete:
-            del cls._message_cache[key]
+        cls._message_cache.sweep()
             
     @classmethod
     async def safe_edit_message_text(cls, client, chat_id, message_id, new_text):
@@ -181,12 +141,12 @@ class ConnectionManager:
         edit_key = f"{chat_id}_{message_id}"
         
         # Check if we've edited this message before
-        if edit_key in cls._last_edit_content and cls._last_edit_content[edit_key] == new_text:
+        if cls._last_edit_content.get(edit_key) == new_text:
             logger.debug(f"Skipping edit for message {message_id} in chat {chat_id}: content unchanged")
             return None
         
         # Store the new content and perform the edit
-        cls._last_edit_content[edit_key] = new_text
+        cls._last_edit_content.set(edit_key, new_text)
         
         try:
             return await client.edit_message_text(chat_id, message_id, new_text)
@@ -8,6 +8,7 @@ from typing import Callable, Any, Optional, Dict, Tuple
 from pyrogram.errors import FloodWait, RPCError, BadRequest, Unauthorized, Forbidden, MessageNotModified
 from pyrogram.errors.exceptions.flood_420 import FloodWait
 from requests.exceptions import ConnectionError, Timeout, RequestException
+from crushe.core.flood import FloodScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -113,8 +114,8 @@ def retry_with_backoff(max_retries: int = 5, initial_delay: float = 1.0, max_del
                     # Handle Telegram's FloodWait explicitly
                     wait_time = e.value if hasattr(e, 'value') else e.x
                     logger.warning(f"FloodWait error in {func.__name__}: waiting for {wait_time} seconds")
-                    # Add a small buffer to the wait time
-                    await asyncio.sleep(wait_time + 1)
+                    # Queue behind the block on the shared scheduler instead of all retrying at once
+                    await FloodScheduler.after_flood(e, wait_time)
                     # Don't count FloodWait against retry limit as it's a server instruction
                     continue
                 except (ConnectionError, Timeout, RequestException, TimeoutError, asyncio.TimeoutError) as e:
@@ -162,10 +163,15 @@ async def safe_execute(func: Callable, *args, **kwargs) -> Optional[Any]:
         *args: Arguments to pass to the function
         **kwargs: Keyword arguments to pass to the function
         
+    Keyword Args:
+        max_retries: Maximum number of retry attempts
+        on_flood_wait: Optional callback invoked with the wait time whenever a FloodWait is hit
+        
     Returns:
         The result of the function or None if an error occurred
     """
     max_retries = kwargs.pop('max_retries', 3) if 'max_retries' in kwargs else 3
+    on_flood_wait = kwargs.pop('on_flood_wait', None)
     current_retry = 0
     
     # Check if first argument is a message with chat_id (for rate limiting)
@@ -182,7 +188,10 @@ async def safe_execute(func: Callable, *args, **kwargs) -> Optional[Any]:
         except FloodWait as e:
             wait_time = e.value if hasattr(e, 'value') else e.x
             logger.warning(f"FloodWait error in {func.__name__}: waiting for {wait_time + 1} seconds")
-            await asyncio.sleep(wait_time + 1)  # Add 1 second buffer
+            if on_flood_wait:
+                on_flood_wait(wait_time)
+            # Queue behind the block on the shared scheduler instead of all retrying at once
+            await FloodScheduler.after_flood(e, wait_time)
             # Don't count FloodWait against retry limit
             continue
         except (ConnectionError, Timeout, RequestException, TimeoutError, asyncio.TimeoutError) as e:
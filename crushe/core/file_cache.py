@@ -0,0 +1,67 @@
+import hashlib
+import os
+from typing import Optional
+
+from pyrogram.enums import MessageMediaType
+from config import FILE_CACHE_SIZE, FILE_CACHE_TTL
+from crushe.core.cache import TTLCache
+from crushe.core.mongo.cache_sync import invalidate
+
+# Media kinds that are downloaded and re-uploaded as is, so a stored file id can stand in for them
+CACHEABLE_MEDIA = (
+    MessageMediaType.VIDEO,
+    MessageMediaType.DOCUMENT,
+    MessageMediaType.AUDIO,
+    MessageMediaType.VOICE,
+    MessageMediaType.PHOTO,
+)
+
+# "<file_unique_id>:<output fingerprint>" -> file id of our first upload of that output (usable by the bot)
+_file_ids = TTLCache(maxsize=FILE_CACHE_SIZE, ttl=FILE_CACHE_TTL, name="file_ids")
+
+
+def file_cache_key(msg, user_id, settings) -> Optional[str]:
+    """Cache key for the upload ``msg`` would produce for this user, or None if it cannot be replayed.
+
+    The key covers everything baked into the uploaded file (name, thumbnail, and the media kind the
+    upload method sends it as), so changing the rename tag, delete/replacement words, thumbnail or
+    upload method simply stops matching older entries.
+    Captions are sent along with every replay and do not need to be part of it.
+    """
+    if msg.media not in CACHEABLE_MEDIA:
+        return None
+    media = getattr(msg, msg.media.value, None)
+    file_unique_id = getattr(media, "file_unique_id", None)
+    if not file_unique_id:
+        return None
+    thumb = f"{user_id}.jpg"
+    thumb_stamp = os.stat(thumb).st_mtime_ns if os.path.exists(thumb) else None
+    fingerprint = repr((
+        msg.media.value,
+        settings.upload_method,
+        sorted(settings.delete_words),
+        sorted(settings.replacement_words.items()),
+        settings.rename_tag,
+        thumb_stamp,
+    ))
+    return f"{file_unique_id}:{hashlib.sha1(fingerprint.encode()).hexdigest()}"
+
+
+def get_cached_file(key) -> Optional[str]:
+    return _file_ids.get(key) if key else None
+
+
+def remember_file(key, message):
+    """Store the file id of ``message``, a Pyrogram message the bot just sent, under ``key``."""
+    if not key or not message or not message.media:
+        return
+    media = getattr(message, message.media.value, None)
+    file_id = getattr(media, "file_id", None)
+    if file_id:
+        _file_ids.set(key, file_id)
+
+
+async def forget_file(key):
+    """Drop an entry whose file id Telegram no longer accepts, in every process."""
+    if key:
+        await invalidate(_file_ids, key)
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+# Priority of the requests made by the current task; lower numbers are released first
+flood_priority: contextvars.ContextVar = contextvars.ContextVar("flood_priority", default=1)
+# Called with the wait time of every FloodWait the current task runs into, waited out here or raised
+flood_listener: contextvars.ContextVar = contextvars.ContextVar("flood_listener", default=None)
+
+
+class FloodScheduler:
+    """Shares FloodWait state between every client of this process.
+
+    Each client's API calls go through ``wait`` before they are sent. A FloodWait blocks the
+    method for that client (or only the peer it was sent to) for everyone; requests that run
+    into the block are queued by priority and let through one at a time once it ends,
+    instead of every caller sleeping and retrying at the same moment.
+    """
+
+    PRIORITY_HIGH = 0    # Interactive commands
+    PRIORITY_NORMAL = 1  # Single links
+    PRIORITY_LOW = 2     # Batches and broadcasts
+
+    # Spacing between queued requests released after a block ends
+    RELEASE_INTERVAL = 0.2
+
+    # scope -> monotonic time its block ends; scope is (client, method) or (client, method, peer)
+    _blocked_until: Dict[Tuple, float] = {}
+
+    # Waiting requests: [priority, seq, future, scopes]
+    _queue: List[List[Any]] = []
+    _seq = itertools.count()
+    _releaser: Optional[asyncio.Task] = None
+
+    @classmethod
+    def set_priority(cls, priority: int):
+        """Set the priority of every request the current task makes from now on."""
+        flood_priority.set(priority)
+
+    @classmethod
+    def listen(cls, callback: Optional[Callable[[Any], None]]):
+        """Have ``callback(seconds)`` called for every FloodWait the current task (and tasks it starts) hits."""
+        flood_listener.set(callback)
+
+    @staticmethod
+    def scopes_for(client: Any, request: Any) -> Tuple[Tuple, ...]:
+        """Scopes a request belongs to: its method, and its method in the target chat."""
+        method = type(request).__name__
+        peer = getattr(request, "peer", None)
+        peer_id = (getattr(peer, "channel_id", None) or getattr(peer, "chat_id", None)
+                   or getattr(peer, "user_id", None))
+        if peer_id is None:
+            return ((id(client), method),)
+        return ((id(client), method), (id(client), method, peer_id))
+
+    @classmethod
+    def block(cls, scope: Tuple, seconds: float):
+        """Block ``scope`` for ``seconds``. Longer existing blocks are kept."""
+        until = time.monotonic() + seconds
+        if until > cls._blocked_until.get(scope, 0):
+            cls._blocked_until[scope] = until
+
+    @classmethod
+    def _remaining(cls, scopes, now: float) -> float:
+        remaining = 0.0
+        for scope in scopes:
+            until = cls._blocked_until.get(scope)
+            if until is None:
+                continue
+            if until <= now:
+                del cls._blocked_until[scope]
+            else:
+                remaining = max(remaining, until - now)
+        return remaining
+
+    @classmethod
+    async def wait(cls, scopes, priority: Optional[int] = None):
+        """Return once none of ``scopes`` is blocked and earlier queued requests for them went first."""
+        queued = any(set(entry[3]) & set(scopes) for entry in cls._queue)
+        if not queued and not cls._remaining(scopes, time.monotonic()):
+            return
+        priority = flood_priority.get() if priority is None else priority
+        future = asyncio.get_running_loop().create_future()
+        cls._queue.append([priority, next(cls._seq), future, tuple(scopes)])
+        if cls._releaser is None or cls._releaser.done():
+            cls._releaser = asyncio.create_task(cls._release())
+        await future
+
+    @classmethod
+    async def _release(cls):
+        """Let queued requests through in priority order as their blocks end."""
+        while cls._queue:
+            now = time.monotonic()
+            cls._queue = [entry for entry in cls._queue if not entry[2].done()]
+            ready = [entry for entry in cls._queue if not cls._remaining(entry[3], now)]
+            if not ready:
+                if cls._queue:
+                    await asyncio.sleep(min(cls._remaining(entry[3], now) for entry in cls._queue))
+                continue
+            entry = min(ready, key=lambda e: (e[0], e[1]))
+            cls._queue.remove(entry)
+            entry[2].set_result(None)
+            await asyncio.sleep(cls.RELEASE_INTERVAL)
+
+    @classmethod
+    async def after_flood(cls, error: Exception, wait_time: float):
+        """Wait out a FloodWait raised by a call: queued on the scheduler if it saw it, else a plain sleep."""
+        scopes = getattr(error, "flood_scopes", None)
+        if scopes:
+            await cls.wait(scopes)
+        else:
+            await asyncio.sleep(wait_time + 1)
+
+    @classmethod
+    def install(cls, client: Any):
+        """Route every API call of a Pyrogram or Telethon client through the scheduler."""
+        if getattr(client, "_flood_scheduled", False):
+            return
+        client._flood_scheduled = True
+        if hasattr(client, "invoke"):
+            cls._install_pyrogram(client)
+        else:
+            cls._install_telethon(client)
+
+    @classmethod
+    def _install_pyrogram(cls, client: Any):
+        original = client.invoke
+
+        async def invoke(query, *args, sleep_threshold: Optional[float] = None, **kwargs):
+            threshold = client.sleep_threshold if sleep_threshold is None else sleep_threshold
+            scopes = cls.scopes_for(client, query)
+            while True:
+                await cls.wait(scopes)
+                try:
+                    # Floods come back to us instead of Pyrogram sleeping on them per call
+                    return await original(query, *args, sleep_threshold=0, **kwargs)
+                except FloodWait as e:
+                    cls._on_flood(client, scopes, e, e.value)
+                    if not isinstance(e.value, int) or e.value > threshold:
+                        raise
+
+        client.invoke = invoke
+
+    @classmethod
+    def _install_telethon(cls, client: Any):
+        original = client._call
+        # Telethon checks its own threshold when a flood comes back; make it raise every one to us
+        default_threshold = client.flood_sleep_threshold
+        client.flood_sleep_threshold = 0
+
+        async def _call(sender, request, ordered=False, flood_sleep_threshold=None):
+            threshold = default_threshold if flood_sleep_threshold is None else flood_sleep_threshold
+            scopes = cls.scopes_for(client, request)
+            while True:
+                await cls.wait(scopes)
+                try:
+                    return await original(sender, request, ordered=ordered, flood_sleep_threshold=0)
+                except FloodWaitError as e:
+                    cls._on_flood(client, scopes, e, e.seconds)
+                    if e.seconds > threshold:
+                        raise
+
+        client._call = _call
+
+    @classmethod
+    def _on_flood(cls, client: Any, scopes, error: Exception, seconds: Any):
+        # A flood on a chat-specific request only blocks that chat
+        scope = scopes[-1]
+        if isinstance(seconds, int):
+            cls.block(scope, seconds + 1)
+        error.flood_scopes = (scope,)
+        logger.warning(f"FloodWait of {seconds}s on {scope[1:]} for {getattr(client, 'name', 'client')}")
+        # Short floods are waited out inside invoke and never reach the caller, so tell it here
+        listener = flood_listener.get()
+        if listener is not None:
+            try:
+                listener(seconds)
+            except Exception as e:
+                logger.warning(f"Flood listener raised: {str(e)}")
@@ -6,18 +6,18 @@ import time , re
 from pyrogram import enums
 from config import CHANNEL_ID, OWNER_ID 
 from crushe.core import script
-from crushe.core.mongo.plans_db import premium_users
+from crushe.core.mongo.plans_db import is_premium
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-import cv2
 from pyrogram.errors import FloodWait, InviteHashInvalid, InviteHashExpired, UserAlreadyParticipant, UserNotParticipant
 from datetime import datetime as dt
-import asyncio, subprocess, re, os, time
+import asyncio, subprocess, re, os, time, json
+from crushe.core.cache import TTLCache
+from crushe.core.progress import ProgressService
 
 
 
 async def chk_user(message, user_id):
-    user = await premium_users()
-    if user_id in user or user_id in OWNER_ID:
+    if user_id in OWNER_ID or await is_premium(user_id):
         return 0
     else:
         # await message.reply_text("Purchase premium to do the tasks...")
@@ -94,14 +94,14 @@ PROGRESS_BAR = """\n
 
 
 async def progress_bar(current, total, ud_type, message, start):
-
-    now = time.time()
-    diff = now - start
-    if round(diff % 10.00) == 0 or current == total:
+    # Edits are throttled and coalesced by ProgressService; the text is only built when one is sent
+    def render(current, total):
+        now = time.time()
+        diff = now - start
         percentage = current * 100 / total
-        speed = current / diff
+        speed = current / diff if diff > 0 else 0
         elapsed_time = round(diff) * 1000
-        time_to_completion = round((total - current) / speed) * 1000
+        time_to_completion = round((total - current) / speed) * 1000 if speed else 0
         estimated_total_time = elapsed_time + time_to_completion
 
         elapsed_time = TimeFormatter(milliseconds=elapsed_time)
@@ -121,12 +121,9 @@ async def progress_bar(current, total, ud_type, message, start):
             humanbytes(speed),
             estimated_total_time if estimated_total_time != '' else "0 s"
         )
-        try:
-            await message.edit(
-                text="{}\n│ {}".format(ud_type, tmp),)             
-                
-        except:
-            pass
+        return "{}\n│ {}".format(ud_type, tmp)
+
+    ProgressService.report(message, current, total, render)
 
 def humanbytes(size):
     if not size:
@@ -192,27 +189,47 @@ def get_link(string):
         return False
 
 
-def video_metadata(file):
+# (path, size, mtime) -> probed metadata, so a file is only probed once however often it is sent
+_metadata_cache = TTLCache(maxsize=1024, ttl=3600, name="video_metadata")
+
+async def video_metadata(file):
+    """Width, height and duration of a video, read from its container headers with ffprobe."""
     default_values = {'width': 1, 'height': 1, 'duration': 1}
     try:
-        vcap = cv2.VideoCapture(file)
-        if not vcap.isOpened():
-            return default_values  # Return defaults if video cannot be opened
-
-        width = round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = vcap.get(cv2.CAP_PROP_FPS)
-        frame_count = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
-
-        if fps <= 0:
-            return default_values  # Return defaults if FPS value is zero or negative
-
-        duration = round(frame_count / fps)
-        if duration <= 0:
-            return default_values  # Return defaults if duration is zero or negative
-
-        vcap.release()
-        return {'width': width, 'height': height, 'duration': duration}
+        stat = os.stat(file)
+        key = (os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+        cached = _metadata_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        process = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=width,height,duration:format=duration",
+            "-of", "json",
+            file,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return default_values
+
+        info = json.loads(stdout or b"{}")
+        stream = (info.get("streams") or [{}])[0]
+        width = int(stream.get("width") or 0)
+        height = int(stream.get("height") or 0)
+        # MKV keeps the duration on the container rather than on the stream
+        duration = round(float(stream.get("duration") or info.get("format", {}).get("duration") or 0))
+        if width <= 0 or height <= 0 or duration <= 0:
+            return default_values  # Return defaults if the headers are missing or incomplete
+
+        metadata = {'width': width, 'height': height, 'duration': duration}
+        _metadata_cache.set(key, metadata)
+        return dict(metadata)
 
     except Exception as e:
         print(f"Error in video_metadata: {e}")
@@ -221,40 +238,13 @@ def video_metadata(file):
 def hhmmss(seconds):
     return time.strftime('%H:%M:%S',time.gmtime(seconds))
 
-async def screenshot(video, duration, sender):
-    if os.path.exists(f'{sender}.jpg'):
-        return f'{sender}.jpg'
-    time_stamp = hhmmss(int(duration)/2)
-    out = dt.now().isoformat("_", "seconds") + ".jpg"
-    cmd = ["ffmpeg",
-           "-ss",
-           f"{time_stamp}", 
-           "-i",
-           f"{video}",
-           "-frames:v",
-           "1", 
-           f"{out}",
-           "-y"
-          ]
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    x = stderr.decode().strip()
-    y = stdout.decode().strip()
-    if os.path.isfile(out):
-        return out
-    else:
-        None  
-
-
-
 last_update_time = time.time()
 
 # Progress callback function with 10% interval update
 async def progress_callback(current, total, progress_message):
+    ProgressService.report(progress_message, current, total, _upload_progress_text)
+
+def _upload_progress_text(current, total):
     percent = (current / total) * 100
     completed_blocks = int(percent // 10)
     remaining_blocks = 10 - completed_blocks
@@ -271,7 +261,7 @@ async def progress_callback(current, total, progress_message):
     total_mb = total / (1024 * 1024)      # Convert total bytes to MB
 
     # Format message with MB and percentage
-    await progress_message.edit(
+    return (
         f"╭──────────────────╮\n"
         f"│        **__Uploading by Crushe...__**       \n"
         f"├──────────\n"
@@ -283,12 +273,10 @@ async def progress_callback(current, total, progress_message):
     )
 
 async def prog_bar(current, total, ud_type, message, start):
-    now = time.time()
-    diff = now - start
-    percentage = current * 100 / total
-
-    # Handle updating the progress bar every 1%
-    if round(diff % 1.00) == 0 or current == total:
+    # Edits are throttled and coalesced by ProgressService; the text is only built when one is sent
+    def render(current, total):
+        diff = time.time() - start
+        percentage = current * 100 / total
         completed_blocks = int(percentage // 10)
         remaining_blocks = 10 - completed_blocks
         fractional_progress = (percentage % 10)
@@ -299,9 +287,9 @@ async def prog_bar(current, total, ud_type, message, start):
             progress += "🟨"
         progress += "🟥" * remaining_blocks
 
-        speed = current / diff
+        speed = current / diff if diff > 0 else 0
         elapsed_time = round(diff) * 1000
-        time_to_completion = round((total - current) / speed) * 1000
+        time_to_completion = round((total - current) / speed) * 1000 if speed else 0
         estimated_total_time = elapsed_time + time_to_completion
 
         elapsed_time = TimeFormatter(milliseconds=elapsed_time)
@@ -314,8 +302,6 @@ async def prog_bar(current, total, ud_type, message, start):
             humanbytes(speed),
             estimated_total_time if estimated_total_time != '' else "0 s"
         )
+        return "{}\n│ {}".format(ud_type, tmp)
 
-        try:
-            await message.edit_text(text="{}\n│ {}".format(ud_type, tmp))
-        except:
-            pass
+    ProgressService.report(message, current, total, render)
@@ -8,47 +8,37 @@ import traceback
 from crushe import app
 from crushe import sex as gf
 from telethon.tl.types import DocumentAttributeVideo
-import pymongo
 from pyrogram import Client, filters
 from pyrogram.errors import ChannelBanned, ChannelInvalid, ChannelPrivate, ChatIdInvalid, ChatInvalid, PeerIdInvalid
 from pyrogram.enums import MessageMediaType
-from crushe.core.func import progress_bar, video_metadata, screenshot, chk_user, progress_callback, prog_bar
+from crushe.core.func import progress_bar, video_metadata, chk_user, progress_callback, prog_bar
 from crushe.core.mongo import db
 from crushe.modules.shrink import is_user_verified
 from pyrogram.types import Message
-from config import MONGO_DB as MONGODB_CONNECTION_STRING, LOG_GROUP, OWNER_ID, STRING, SECONDS
-import cv2
+from config import LOG_GROUP, OWNER_ID, STRING, SECONDS, STREAM_RELAY
 import random
 from crushe.core.mongo.db import set_session, remove_session, get_data
+from crushe.core.mongo.settings_db import (
+    get_settings, save_delete_words, save_replacement_words, save_upload_method, save_preference,
+    reset_settings, is_channel_locked, lock_channel
+)
 import string
 from telethon import events, Button
 from io import BytesIO
-from tricky import fast_upload
+from tricky import fast_upload, fast_stream_upload, FileSlice
+from tricky.journal import PartJournal
+from crushe.core.thumbs import get_thumbnail
+from crushe.core.progress import ProgressService
+from crushe.core.file_cache import file_cache_key, get_cached_file, remember_file, forget_file
 from crushe.core.connection_manager import ConnectionManager
+from crushe.core.jobs import JobQueue
 
 # ----------------- CHUNK SPLITTING FUNCTIONS -----------------
 MAX_CHUNK_SIZE = 2000 * 1024**2  # ~2GB
 
-def split_file(file_path, chunk_size=MAX_CHUNK_SIZE):
-    chunk_files = []
-    chunk_number = 1
-    buffer_size = 64 * 1024  # 64KB
-    with open(file_path, "rb") as f:
-        while True:
-            bytes_written = 0
-            chunk_filename = f"{file_path}.part{chunk_number}"
-            with open(chunk_filename, "wb") as chunk_file:
-                while bytes_written < chunk_size:
-                    data = f.read(min(buffer_size, chunk_size - bytes_written))
-                    if not data:
-                        break
-                    chunk_file.write(data)
-                    bytes_written += len(data)
-            if bytes_written == 0:
-                break
-            chunk_files.append(chunk_filename)
-            chunk_number += 1
-    return chunk_files
+def chunk_ranges(file_size, chunk_size=MAX_CHUNK_SIZE):
+    """(offset, length) of every chunk; chunks are uploaded straight from the original file."""
+    return [(offset, min(chunk_size, file_size - offset)) for offset in range(0, file_size, chunk_size)]
 
 async def delete_after(message, delay=5):
     await asyncio.sleep(delay)
@@ -69,13 +59,38 @@ async def cache_message(cache_key: str, message):
 def thumbnail(sender):
     return "static/crushe.jpg"
 
-DB_NAME = "smart_users"
-COLLECTION_NAME = "super_user"
-VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'flv', 'wmv', 'webm', 'mpg', 'mpeg', '3gp', 'ts', 'm4v', 'f4v', 'vob']
+async def remember_telethon_upload(replay_key, log_message):
+    """Telethon messages carry no Pyrogram file id, so read our LOG_GROUP copy back through the bot."""
+    if not replay_key:
+        return
+    try:
+        remember_file(replay_key, await app.get_messages(LOG_GROUP, log_message.id))
+    except Exception as e:
+        print(f"Could not cache file id: {e}")
+
+def _download_record(sender, source_id):
+    return PartJournal(f"downloaded:{sender}:{source_id}")
+
+def finished_download(sender, source_id, size):
+    """Path of the renamed file an earlier attempt of this link finished downloading, if it is still there."""
+    if not source_id or not size:
+        return None
+    record = _download_record(sender, source_id)
+    header = record.resume({"size": size})
+    record.close()
+    path = header and header.get("path")
+    if path and os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    return None
+
+def record_download(sender, source_id, size, path):
+    """Remember a complete download, so a retried job uploads it without fetching it again."""
+    if source_id and size:
+        record = _download_record(sender, source_id)
+        record.start({"size": size, "path": path})
+        record.close()
 
-mongo_client = pymongo.MongoClient(MONGODB_CONNECTION_STRING)
-db = mongo_client[DB_NAME]
-collection = db[COLLECTION_NAME]
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'flv', 'wmv', 'webm', 'mpg', 'mpeg', '3gp', 'ts', 'm4v', 'f4v', 'vob']
 
 if STRING:
     from crushe import pro
@@ -84,13 +99,15 @@ else:
     pro = None
     print("STRING is not available. 'app' is set to None.")
 
-async def fetch_upload_method(user_id):
-    """Fetch the user's preferred upload method."""
-    user_data = collection.find_one({"user_id": user_id})
-    return user_data.get("upload_method", "Pyrogram") if user_data else "Pyrogram"
+async def get_msg(userbot, sender, edit_id, msg_link, i, message, turn=None, settings=None):
+    """Save one message. ``turn`` is awaited before anything is sent so batches keep their order.
 
-async def get_msg(userbot, sender, edit_id, msg_link, i, message):
+    ``settings`` lets a batch load the user's settings once and share them across its messages.
+    """
     from crushe.core.error_handler import retry_with_backoff
+    async def wait_turn():
+        if turn is not None:
+            await turn()
     edit = ""
     chat = ""
     progress_message = None
@@ -98,17 +115,19 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
     if "?single" in msg_link:
         msg_link = msg_link.split("?single")[0]
     msg_id = int(msg_link.split("/")[-1]) + int(i)
-    saved_channel_ids = load_saved_channel_ids()
+    if settings is None:
+        settings = await get_settings(sender)
     if 't.me/c/' in msg_link or 't.me/b/' in msg_link:
         parts = msg_link.split("/")
         if 't.me/b/' not in msg_link:
             chat = int('-100' + str(parts[parts.index('c') + 1]))
         else:
             chat = msg_link.split("/")[-2]
-        if chat in saved_channel_ids:
+        if is_channel_locked(chat):
             await app.edit_message_text(message.chat.id, edit_id, "Sorry! dude 😎 This channel is protected 🔐 by **__Crushe__**")
             return
         file = ""
+        source_id = None
         try:
             size_limit = 2 * 1024 * 1024 * 1024  # 2GB
             chatx = message.chat.id
@@ -132,18 +151,17 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                 print("Using cached message")
             else:
                 # Execute the get_message_with_retry coroutine with a connection lock
-                msg = await ConnectionManager.with_connection_lock(connection_id, get_message_with_retry())
+                msg = await ConnectionManager.with_connection_lock(connection_id, get_message_with_retry(), session=id(userbot))
                 # Cache the message for future use
                 await cache_message(cache_key, msg)
             print(msg)
-            target_chat_id = user_chat_ids.get(chatx, chatx)
+            target_chat_id = (settings.chat_id or chatx)
             freecheck = await chk_user(message, sender)
             verified = await is_user_verified(sender)
             original_caption = msg.caption if msg.caption else ''
-            custom_caption = get_user_caption_preference(sender)
+            custom_caption = settings.caption
             final_caption = f"{original_caption}" if custom_caption else f"{original_caption}"
-            replacements = load_replacement_words(sender)
-            for word, replace_word in replacements.items():
+            for word, replace_word in settings.replacement_words.items():
                 final_caption = final_caption.replace(word, replace_word)
             caption = f"{final_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{final_caption}"
             if msg.service is not None:
@@ -152,7 +170,8 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                 return None
             if msg.media:
                 if msg.media == MessageMediaType.WEB_PAGE:
-                    target_chat_id = user_chat_ids.get(chatx, chatx)
+                    target_chat_id = (settings.chat_id or chatx)
+                    await wait_turn()
                     edit = await app.edit_message_text(sender, edit_id, "Cloning...")
                     try:
                         message_sent = await app.send_message(target_chat_id, msg.text.markdown)
@@ -165,12 +184,15 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                         await edit.delete()
                         # No file downloaded in this branch—cleanup not needed.
                         return
+                    except JobQueue.TRANSIENT_ERRORS:
+                        raise
                     except Exception as e:
                         await edit.edit(f"Error sending message: {str(e)}")
                         return
             if not msg.media:
                 if msg.text:
-                    target_chat_id = user_chat_ids.get(chatx, chatx)
+                    target_chat_id = (settings.chat_id or chatx)
+                    await wait_turn()
                     edit = await app.edit_message_text(sender, edit_id, "Cloning...")
                     message_sent = await app.send_message(target_chat_id, msg.text.markdown)
                     if msg.pinned_message:
@@ -182,6 +204,7 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                     await edit.delete()
                     return
             if msg.sticker:
+                await wait_turn()
                 edit = await app.edit_message_text(sender, edit_id, "Sticker detected...")
                 result = await app.send_sticker(target_chat_id, msg.sticker.file_id)
                 await result.copy(LOG_GROUP)
@@ -194,12 +217,6 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                 await edit.edit("**__❌ File size is greater than 2 GB, purchase premium to proceed or use /token to get 3 hour access for free__")
                 return
             edit = await app.edit_message_text(sender, edit_id, "Trying to Download...")
-            file = await userbot.download_media(
-                msg,
-                progress=progress_bar,
-                progress_args=("╭─────────────────────╮\n│      **__Downloading by Crushe__...**\n├─────────────────────", edit, time.time()))
-            # --- Updated File-Renaming Block ---
-            custom_rename_tag = get_user_rename_preference(chatx)
             # Detect if the media is truly a video
             is_video = False
             if msg.media == MessageMediaType.VIDEO:
@@ -207,44 +224,57 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
             elif msg.document and msg.document.mime_type and "video" in msg.document.mime_type.lower():
                 is_video = True
 
-            last_dot_index = str(file).rfind('.')
-            if last_dot_index != -1 and last_dot_index != 0:
-                ggn_ext = str(file)[last_dot_index + 1:]
-                if ggn_ext.isalpha() and len(ggn_ext) <= 9:
-                    if is_video and ggn_ext.lower() in VIDEO_EXTENSIONS:
-                        original_file_name = str(file)[:last_dot_index]
-                        file_extension = 'mp4'
-                    else:
-                        original_file_name = str(file)[:last_dot_index]
-                        file_extension = ggn_ext
+            # Media we already uploaded with the same name/thumbnail is re-sent by file id, no download needed
+            replay_key = file_cache_key(msg, chatx, settings)
+            cached_file_id = get_cached_file(replay_key)
+            if cached_file_id:
+                await wait_turn()
+                try:
+                    message_sent = await app.send_cached_media(target_chat_id, cached_file_id, caption=caption)
+                except Exception as e:
+                    print(f"Cached file id rejected, downloading again: {e}")
+                    await forget_file(replay_key)
                 else:
-                    original_file_name = str(file)
-                    file_extension = 'mp4' if is_video else ''
-            else:
-                original_file_name = str(file)
-                file_extension = 'mp4' if is_video else ''
-
-            # Apply delete & replacement words on the filename
-            delete_words = load_delete_words(chatx)
-            for word in delete_words:
-                original_file_name = original_file_name.replace(word, "")
-            replacements = load_replacement_words(chatx)
-            for word, replace_word in replacements.items():
-                original_file_name = original_file_name.replace(word, replace_word)
-            if file_extension:
-                new_file_name = original_file_name + " " + custom_rename_tag + "." + file_extension
+                    if msg.pinned_message:
+                        try:
+                            await message_sent.pin(both_sides=True)
+                        except Exception:
+                            await message_sent.pin()
+                    await message_sent.copy(LOG_GROUP)
+                    await edit.delete()
+                    return
+
+            if STREAM_RELAY and file_size and file_size <= size_limit and can_stream(msg, is_video):
+                if settings.upload_method == "Telethon":
+                    await stream_relay(userbot, msg, sender, edit, target_chat_id, caption, is_video, wait_turn, settings, replay_key)
+                    return
+
+            # Upload journals are keyed on the source, so a retry resumes the upload it interrupted
+            source = getattr(msg, msg.media.value, None) if msg.media else None
+            source_id = getattr(source, "file_unique_id", None)
+            source_size = getattr(source, "file_size", None)
+            file = finished_download(sender, source_id, source_size)
+            if file:
+                await wait_turn()
             else:
-                new_file_name = original_file_name + " " + custom_rename_tag
-            os.rename(file, new_file_name)
-            file = new_file_name
-            # --- End Updated Block ---
+                file = await userbot.download_media(
+                    msg,
+                    progress=progress_bar,
+                    progress_args=("╭─────────────────────╮\n│      **__Downloading by Crushe__...**\n├─────────────────────", edit, time.time()))
+                await wait_turn()
+                # --- Updated File-Renaming Block ---
+                new_file_name = build_file_name(file, is_video, chatx, settings)
+                os.rename(file, new_file_name)
+                file = new_file_name
+                # --- End Updated Block ---
+                record_download(sender, source_id, source_size, file)
 
             await edit.edit('Applying Watermark ...')
-            metadata = video_metadata(file)
+            metadata = await video_metadata(file)
             width = metadata['width']
             height = metadata['height']
             duration = metadata['duration']
-            thumb_path = await screenshot(file, duration, chatx)
+            thumb_path = await get_thumbnail(file, duration, chatx, client=userbot, media=msg.video or msg.document, grab=is_video)
             file_extension = file.split('.')[-1]
             await edit.edit('**__Checking file...__**')
 
@@ -255,58 +285,71 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                     await edit.delete()
                 except Exception:
                     pass
-                status_msg1 = await app.send_message(sender, f"Large file detected (> {file_size/1024**3:.2f} GB). Splitting into 2GB chunks...")
-                status_msg2 = await app.send_message(sender, "Starting to split the file...")
-                chunk_files = split_file(file, MAX_CHUNK_SIZE)
-                total_chunks = len(chunk_files)
-                status_msg3 = await app.send_message(sender, f"File split into {total_chunks} chunk(s).")
-                target_chat_id = user_chat_ids.get(chatx, sender)
-                delete_words = load_delete_words(sender)
-                custom_caption = get_user_caption_preference(sender)
+                ranges = chunk_ranges(file_size, MAX_CHUNK_SIZE)
+                total_chunks = len(ranges)
+                status_msg1 = await app.send_message(sender, f"Large file detected (> {file_size/1024**3:.2f} GB). Uploading it in {total_chunks} chunk(s) of 2GB...")
+                target_chat_id = (settings.chat_id or sender)
+                custom_caption = settings.caption
                 original_caption = msg.caption if msg.caption else ''
                 final_caption = f"{original_caption}"
-                replacements = load_replacement_words(chatx)
-                for word, replace_word in replacements.items():
+                for word, replace_word in settings.replacement_words.items():
                     final_caption = final_caption.replace(word, replace_word)
                 caption = f"{final_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{final_caption}"
-                upload_failed = False
-                for i, chunk in enumerate(chunk_files):
+                base_name = os.path.basename(file)
+
+                async def upload_chunk(i):
+                    offset, length = ranges[i]
+                    progress_status = await gf.send_message(sender, f"Uploading chunk {i+1} of {total_chunks} ...")
                     try:
-                        chunk_status_msg = await app.send_message(sender, f"Uploading chunk {i+1} of {total_chunks}...")
-                        progress_status = await app.send_message(sender, f"Uploading chunk {i+1} of {total_chunks} ...")
-                        chunk_caption = caption + f"\n\nPart {i+1} of {total_chunks}"
-                        message_sent = await app.send_document(
-                            chat_id=target_chat_id,
-                            document=chunk,
-                            caption=chunk_caption,
-                            progress=progress_bar,
-                            progress_args=('**Uploading by Crushe...**', progress_status, time.time())
+                        return await fast_upload(
+                            gf,
+                            FileSlice(file, offset, length),
+                            name=f"{base_name}.part{i+1}",
+                            progress_hook=ProgressService.hook(progress_status, lambda done, total: progress_callback(done, total, sender)),
+                            source_id=source_id
                         )
-                        if msg.pinned_message:
-                            try:
-                                await message_sent.pin(both_sides=True)
-                            except Exception:
-                                await message_sent.pin()
-                        try:
-                            await message_sent.copy(LOG_GROUP)
-                        except Exception as e:
-                            print(f"Error copying chunk to LOG_GROUP: {e}")
-                        await app.edit_message_text(sender, progress_status.id, f"Chunk {i+1} of {total_chunks} uploaded successfully!")
-                        asyncio.create_task(delete_after(chunk_status_msg))
-                        asyncio.create_task(delete_after(progress_status))
-                    except Exception as chunk_error:
-                        upload_failed = True
-                        await app.send_message(sender, f"Error uploading chunk {i+1}: {chunk_error}")
                     finally:
-                        if os.path.exists(chunk):
-                            os.remove(chunk)
+                        asyncio.create_task(delete_after(progress_status))
+
+                upload_failed = False
+                # Chunk N+1 starts uploading as soon as chunk N is uploaded, while N is still being sent
+                next_upload = asyncio.create_task(upload_chunk(0))
+                try:
+                    for i in range(total_chunks):
+                        current, next_upload = next_upload, None
+                        try:
+                            uploaded = await current
+                        except Exception as chunk_error:
+                            uploaded = None
+                            upload_failed = True
+                            await app.send_message(sender, f"Error uploading chunk {i+1}: {chunk_error}")
+                        if i + 1 < total_chunks:
+                            next_upload = asyncio.create_task(upload_chunk(i + 1))
+                        if uploaded is None:
+                            continue
+                        try:
+                            chunk_caption = caption + f"\n\nPart {i+1} of {total_chunks}"
+                            message_sent = await gf.send_file(target_chat_id, uploaded, caption=chunk_caption, force_document=True)
+                            if msg.pinned_message:
+                                try:
+                                    await gf.pin_message(target_chat_id, message_sent)
+                                except Exception:
+                                    pass
+                            try:
+                                await gf.send_file(LOG_GROUP, uploaded, caption=chunk_caption, force_document=True)
+                            except Exception as e:
+                                print(f"Error copying chunk to LOG_GROUP: {e}")
+                        except Exception as chunk_error:
+                            upload_failed = True
+                            await app.send_message(sender, f"Error uploading chunk {i+1}: {chunk_error}")
+                finally:
+                    if next_upload:
+                        next_upload.cancel()
                 if os.path.exists(file):
                     os.remove(file)
                 file = None
                 if not upload_failed:
                     asyncio.create_task(delete_after(status_msg1))
-                    asyncio.create_task(delete_after(status_msg2))
-                    asyncio.create_task(delete_after(status_msg3))
                     final_status = await app.send_message(sender, "All chunks uploaded successfully!")
                     asyncio.create_task(delete_after(final_status))
                 return
@@ -315,23 +358,24 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
             if msg.voice:
                 result = await app.send_voice(target_chat_id, file)
                 await result.copy(LOG_GROUP)
+                remember_file(replay_key, result)
                 if os.path.exists(file):
                     os.remove(file)
                 file = None
             elif msg.audio:
                 result = await app.send_audio(target_chat_id, file, caption=caption)
                 await result.copy(LOG_GROUP)
+                remember_file(replay_key, result)
                 if os.path.exists(file):
                     os.remove(file)
                 file = None
             elif msg.media == MessageMediaType.VIDEO and msg.video.mime_type in ["video/mp4", "video/x-matroska"]:
-                metadata = video_metadata(file)
+                metadata = await video_metadata(file)
                 width = metadata['width']
                 height = metadata['height']
                 duration = metadata['duration']
-                thumb_path = await screenshot(file, duration, chatx)
                 if duration <= 300:
-                    upload_method = await fetch_upload_method(sender)
+                    upload_method = settings.upload_method
                     if upload_method == "Pyrogram":
                         message_sent = await app.send_video(
                             chat_id=target_chat_id,
@@ -345,6 +389,7 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                             progress_args=("╭─────────────────────╮\n│      **__Crushe Uploader__**\n├─────────────────────", edit, time.time())
                         )
                         await message_sent.copy(LOG_GROUP)
+                        remember_file(replay_key, message_sent)
                         await edit.delete()
                         if os.path.exists(file):
                             os.remove(file)
@@ -356,9 +401,9 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                         uploaded = await fast_upload(
                             gf,
                             file,
-                            reply=progress_message,
                             name=None,
-                            progress_bar_function=lambda done, total: progress_callback(done, total, sender)
+                            progress_hook=ProgressService.hook(progress_message, lambda done, total: progress_callback(done, total, sender)),
+                            source_id=source_id
                         )
                         await gf.send_file(
                             target_chat_id,
@@ -367,29 +412,27 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                             attributes=[DocumentAttributeVideo(duration=duration, w=width, h=height, supports_streaming=True)],
                             thumb=thumb_path
                         )
-                        await gf.send_file(
+                        log_message = await gf.send_file(
                             LOG_GROUP,
                             uploaded,
                             caption=caption,
                             attributes=[DocumentAttributeVideo(duration=duration, w=width, h=height, supports_streaming=True)],
                             thumb=thumb_path
                         )
+                        await remember_telethon_upload(replay_key, log_message)
                         await progress_message.delete()
                         if os.path.exists(file):
                             os.remove(file)
                         file = None
                         return
-                delete_words = load_delete_words(sender)
-                custom_caption = get_user_caption_preference(sender)
+                custom_caption = settings.caption
                 original_caption = msg.caption if msg.caption else ''
                 final_caption = f"{original_caption}" if custom_caption else f"{original_caption}"
-                replacements = load_replacement_words(sender)
-                for word, replace_word in replacements.items():
+                for word, replace_word in settings.replacement_words.items():
                     final_caption = final_caption.replace(word, replace_word)
                 caption = f"{final_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{final_caption}"
-                target_chat_id = user_chat_ids.get(chatx, chatx)
-                thumb_path = await screenshot(file, duration, chatx)
-                upload_method = await fetch_upload_method(sender)
+                target_chat_id = (settings.chat_id or chatx)
+                upload_method = settings.upload_method
                 try:
                     if upload_method == "Pyrogram":
                         message_sent = await app.send_video(
@@ -405,15 +448,16 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                             progress_args=("╭─────────────────────╮\n│      **__Crushe Uploader__**\n├─────────────────────", edit, time.time())
                         )
                         await message_sent.copy(LOG_GROUP)
+                        remember_file(replay_key, message_sent)
                     elif upload_method == "Telethon":
                         await edit.delete()
                         progress_message = await gf.send_message(sender, "**__Starting Upload by Crushe__**")
                         uploaded = await fast_upload(
                             gf,
                             file,
-                            reply=progress_message,
                             name=None,
-                            progress_bar_function=lambda done, total: progress_callback(done, total, sender)
+                            progress_hook=ProgressService.hook(progress_message, lambda done, total: progress_callback(done, total, sender)),
+                            source_id=source_id
                         )
                         await gf.send_file(
                             target_chat_id,
@@ -422,17 +466,20 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                             attributes=[DocumentAttributeVideo(duration=duration, w=width, h=height, supports_streaming=True)],
                             thumb=thumb_path
                         )
-                        await gf.send_file(
+                        log_message = await gf.send_file(
                             LOG_GROUP,
                             uploaded,
                             caption=caption,
                             attributes=[DocumentAttributeVideo(duration=duration, w=width, h=height, supports_streaming=True)],
                             thumb=thumb_path
                         )
+                        await remember_telethon_upload(replay_key, log_message)
                     # In either branch, after upload, remove the file.
                     if os.path.exists(file):
                         os.remove(file)
                     file = None
+                except JobQueue.TRANSIENT_ERRORS:
+                    raise
                 except Exception:
                     try:
                         await app.edit_message_text(sender, edit_id, "The bot is not an admin in the specified chat.")
@@ -440,15 +487,13 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                         await progress_message.edit("Something Greate happened my jaan")
             elif msg.media == MessageMediaType.PHOTO:
                 await edit.edit("**Uploading photo...")
-                delete_words = load_delete_words(sender)
-                custom_caption = get_user_caption_preference(sender)
+                custom_caption = settings.caption
                 original_caption = msg.caption if msg.caption else ''
                 final_caption = f"{original_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{original_caption}"
-                replacements = load_replacement_words(sender)
-                for word, replace_word in replacements.items():
+                for word, replace_word in settings.replacement_words.items():
                     final_caption = final_caption.replace(word, replace_word)
                 caption = final_caption
-                target_chat_id = user_chat_ids.get(sender, sender)
+                target_chat_id = (settings.chat_id or sender)
                 message_sent = await app.send_photo(chat_id=target_chat_id, photo=file, caption=caption)
                 if msg.pinned_message:
                     try:
@@ -456,22 +501,21 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                     except Exception as e:
                         await message_sent.pin()
                 await message_sent.copy(LOG_GROUP)
+                remember_file(replay_key, message_sent)
                 if os.path.exists(file):
                     os.remove(file)
                 file = None
             else:
-                delete_words = load_delete_words(sender)
-                custom_caption = get_user_caption_preference(sender)
+                custom_caption = settings.caption
                 original_caption = msg.caption if msg.caption else ''
                 final_caption = f"{original_caption}" if custom_caption else f"{original_caption}"
-                replacements = load_replacement_words(chatx)
-                for word, replace_word in replacements.items():
+                for word, replace_word in settings.replacement_words.items():
                     final_caption = final_caption.replace(word, replace_word)
                 caption = f"{final_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{final_caption}"
                 file_extension = file_extension.lower()
                 video_extensions = {'mkv', 'mp4', 'webm', 'mpe4', 'mpeg', 'ts', 'avi', 'flv', 'mov', 'm4v', '3gp', '3g2', 'wmv', 'vob', 'ogv', 'ogx', 'qt', 'f4v', 'f4p', 'f4a', 'f4b', 'dat', 'rm', 'rmvb', 'asf', 'amv', 'divx'}
-                target_chat_id = user_chat_ids.get(chatx, chatx)
-                upload_method = await fetch_upload_method(sender)
+                target_chat_id = (settings.chat_id or chatx)
+                upload_method = settings.upload_method
                 try:
                     if file_extension in video_extensions:
                         if upload_method == "Pyrogram":
@@ -488,15 +532,16 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                                 progress_args=("╭─────────────────────╮\n│      **__Crushe Uploader__**\n├─────────────────────", edit, time.time())
                             )
                             await message_sent.copy(LOG_GROUP)
+                            remember_file(replay_key, message_sent)
                         elif upload_method == "Telethon":
                             await edit.delete()
                             progress_message = await gf.send_message(sender, "**__Starting Upload by Crushe__**")
                             uploaded = await fast_upload(
                                 gf,
                                 file,
-                                reply=progress_message,
                                 name=None,
-                                progress_bar_function=lambda done, total: progress_callback(done, total, sender)
+                                progress_hook=ProgressService.hook(progress_message, lambda done, total: progress_callback(done, total, sender)),
+                                source_id=source_id
                             )
                             await gf.send_file(
                                 target_chat_id,
@@ -505,13 +550,14 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                                 attributes=[DocumentAttributeVideo(duration=metadata['duration'], w=metadata['width'], h=metadata['height'], supports_streaming=True)],
                                 thumb=thumb_path
                             )
-                            await gf.send_file(
+                            log_message = await gf.send_file(
                                 LOG_GROUP,
                                 uploaded,
                                 caption=caption,
                                 attributes=[DocumentAttributeVideo(duration=metadata['duration'], w=metadata['width'], h=metadata['height'], supports_streaming=True)],
                                 thumb=thumb_path
                             )
+                            await remember_telethon_upload(replay_key, log_message)
                     else:
                         if upload_method == "Pyrogram":
                             message_sent = await app.send_document(
@@ -523,21 +569,25 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                                 progress_args=("╭─────────────────────╮\n│      **__Crushe Uploader__**\n├─────────────────────", edit, time.time())
                             )
                             await message_sent.copy(LOG_GROUP)
+                            remember_file(replay_key, message_sent)
                         elif upload_method == "Telethon":
                             await edit.delete()
                             progress_message = await gf.send_message(sender, "Uploading by Crushe...")
                             uploaded = await fast_upload(
                                 gf,
                                 file,
-                                reply=progress_message,
                                 name=None,
-                                progress_bar_function=lambda done, total: progress_callback(done, total, sender)
+                                progress_hook=ProgressService.hook(progress_message, lambda done, total: progress_callback(done, total, sender)),
+                                source_id=source_id
                             )
                             await gf.send_file(target_chat_id, uploaded, caption=caption, thumb=thumb_path)
-                            await gf.send_file(LOG_GROUP, uploaded, caption=caption, thumb=thumb_path)
+                            log_message = await gf.send_file(LOG_GROUP, uploaded, caption=caption, thumb=thumb_path)
+                            await remember_telethon_upload(replay_key, log_message)
                     if os.path.exists(file):
                         os.remove(file)
                     file = None
+                except JobQueue.TRANSIENT_ERRORS:
+                    raise
                 except Exception:
                     try:
                         await app.edit_message_text(sender, edit_id, "The bot is not an admin in the specified chat.")
@@ -550,31 +600,95 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
         except (ChannelBanned, ChannelInvalid, ChannelPrivate, ChatIdInvalid, ChatInvalid):
             await app.edit_message_text(sender, edit_id, "Have you joined the channel?")
             return
+        except JobQueue.TRANSIENT_ERRORS:
+            # Floods, dropped connections and timeouts: the job queue runs the link again
+            raise
         except Exception as e:
             print(f"Errrrror {e}")
             await edit.delete()
+        finally:
+            # file is None once it was uploaded and removed; until then a retry may still need it
+            if file is None and source_id:
+                _download_record(sender, source_id).discard()
     else:
         edit = await app.edit_message_text(sender, edit_id, "Cloning by Crushe...")
         try:
             chat = msg_link.split("/")[-2]
-            await copy_message_with_chat_id(app, sender, chat, msg_id)
+            await wait_turn()
+            await copy_message_with_chat_id(app, sender, chat, msg_id, settings)
             await edit.delete()
+        except JobQueue.TRANSIENT_ERRORS:
+            raise
         except Exception as e:
             await app.edit_message_text(sender, edit_id, f'Failed to save: `{msg_link}`\n\nError: {str(e)}')
 
-async def copy_message_with_chat_id(client, sender, chat_id, message_id):
-    target_chat_id = user_chat_ids.get(sender, sender)
+def build_file_name(file, is_video, user_id, settings):
+    """Apply the user's rename tag and delete/replace words to a file name."""
+    custom_rename_tag = settings.rename_tag
+    last_dot_index = str(file).rfind('.')
+    if last_dot_index != -1 and last_dot_index != 0:
+        ggn_ext = str(file)[last_dot_index + 1:]
+        if ggn_ext.isalpha() and len(ggn_ext) <= 9:
+            if is_video and ggn_ext.lower() in VIDEO_EXTENSIONS:
+                original_file_name = str(file)[:last_dot_index]
+                file_extension = 'mp4'
+            else:
+                original_file_name = str(file)[:last_dot_index]
+                file_extension = ggn_ext
+        else:
+            original_file_name = str(file)
+            file_extension = 'mp4' if is_video else ''
+    else:
+        original_file_name = str(file)
+        file_extension = 'mp4' if is_video else ''
+
+    # Apply delete & replacement words on the filename
+    original_file_name = settings.clean(original_file_name)
+    if file_extension:
+        return original_file_name + " " + custom_rename_tag + "." + file_extension
+    return original_file_name + " " + custom_rename_tag
+
+def can_stream(msg, is_video):
+    """Streaming needs the video attributes up front, so only native videos and plain documents qualify."""
+    if msg.media == MessageMediaType.VIDEO:
+        return bool(msg.video.duration and msg.video.width and msg.video.height)
+    return msg.media == MessageMediaType.DOCUMENT and not is_video
+
+async def stream_relay(userbot, msg, sender, edit, target_chat_id, caption, is_video, wait_turn, settings, replay_key=None):
+    """Relay a file straight from the userbot download into the Telethon uploader, never touching disk."""
+    media = msg.video if msg.media == MessageMediaType.VIDEO else msg.document
+    source_name = media.file_name or f"{msg.id}.{'mp4' if is_video else 'bin'}"
+    file_name = os.path.basename(build_file_name(source_name, is_video, sender, settings))
+    # Nothing is on disk to grab a frame from; the user's thumbnail or Telegram's own is used
+    thumb_path = await get_thumbnail(None, getattr(media, "duration", 0), sender, client=userbot, media=media, grab=False)
+    attributes = None
+    if msg.media == MessageMediaType.VIDEO:
+        attributes = [DocumentAttributeVideo(duration=media.duration, w=media.width, h=media.height, supports_streaming=True)]
+    await edit.delete()
+    progress_message = await gf.send_message(sender, "**__Relaying by Crushe ⚡__**")
+    try:
+        uploaded = await fast_stream_upload(
+            gf,
+            userbot.stream_media(msg),
+            media.file_size,
+            file_name,
+            progress_hook=ProgressService.hook(progress_message, lambda done, total: progress_callback(done, total, sender))
+        )
+        await wait_turn()
+        await gf.send_file(target_chat_id, uploaded, caption=caption, attributes=attributes, thumb=thumb_path)
+        log_message = await gf.send_file(LOG_GROUP, uploaded, caption=caption, attributes=attributes, thumb=thumb_path)
+        await remember_telethon_upload(replay_key, log_message)
+    finally:
+        await progress_message.delete()
+
+async def copy_message_with_chat_id(client, sender, chat_id, message_id, settings):
+    target_chat_id = (settings.chat_id or sender)
     try:
         msg = await client.get_messages(chat_id, message_id)
-        custom_caption = get_user_caption_preference(sender)
+        custom_caption = settings.caption
         original_caption = msg.caption if msg.caption else ''
         final_caption = f"{original_caption}" if custom_caption else f"{original_caption}"
-        delete_words = load_delete_words(sender)
-        for word in delete_words:
-            final_caption = final_caption.replace(word, '  ')
-        replacements = load_replacement_words(sender)
-        for word, replace_word in replacements.items():
-            final_caption = final_caption.replace(word, replace_word)
+        final_caption = settings.clean(final_caption, deleted='  ')
         caption = f"{final_caption}\n\n__**{custom_caption}**__" if custom_caption else f"{final_caption}"
         if msg.media:
             if msg.media == MessageMediaType.VIDEO:
@@ -596,69 +710,14 @@ async def copy_message_with_chat_id(client, sender, chat_id, message_id):
                 await result.pin(both_sides=True)
             except Exception as e:
                 await result.pin()
+    except JobQueue.TRANSIENT_ERRORS:
+        raise
     except Exception as e:
         error_message = f"Error occurred while sending message to chat ID {target_chat_id}: {str(e)}"
         await client.send_message(sender, error_message)
         await client.send_message(sender, f"Make Bot admin in your Channel - {target_chat_id} and restart the process after /cancel")
 
 user_states = {}
-user_chat_ids = {}
-
-def load_delete_words(user_id):
-    try:
-        words_data = collection.find_one({"_id": user_id})
-        if words_data:
-            return set(words_data.get("delete_words", []))
-        else:
-            return set()
-    except Exception as e:
-        print(f"Error loading delete words: {e}")
-        return set()
-
-def save_delete_words(user_id, delete_words):
-    try:
-        collection.update_one({"_id": user_id}, {"$set": {"delete_words": list(delete_words)}}, upsert=True)
-    except Exception as e:
-        print(f"Error saving delete words: {e}")
-
-def load_replacement_words(user_id):
-    try:
-        words_data = collection.find_one({"_id": user_id})
-        if words_data:
-            return words_data.get("replacement_words", {})
-        else:
-            return {}
-    except Exception as e:
-        print(f"Error loading replacement words: {e}")
-        return {}
-
-def save_replacement_words(user_id, replacements):
-    try:
-        collection.update_one({"_id": user_id}, {"$set": {"replacement_words": replacements}}, upsert=True)
-    except Exception as e:
-        print(f"Error saving replacement words: {e}")
-
-user_rename_preferences = {}
-user_caption_preferences = {}
-
-def load_user_session(sender_id):
-    user_data = collection.find_one({"user_id": sender_id})
-    if user_data:
-        return user_data.get("session")
-    else:
-        return None
-
-async def set_rename_command(user_id, custom_rename_tag):
-    user_rename_preferences[str(user_id)] = custom_rename_tag
-
-def get_user_rename_preference(user_id):
-    return user_rename_preferences.get(str(user_id), ' ')
-
-async def set_caption_command(user_id, custom_caption):
-    user_caption_preferences[str(user_id)] = custom_caption
-
-def get_user_caption_preference(user_id):
-    return user_caption_preferences.get(str(user_id), '')
 
 sessions = {}
 SET_PIC = "settings.jpg"
@@ -702,7 +761,7 @@ async def callback_query_handler(event):
         sessions[user_id] = 'deleteword'
     elif event.data == b'logout':
         await remove_session(user_id)
-        user_data = await get_data(user_id)
+        user_data = await get_data(user_id, "session")
         if user_data and user_data.get("session") is None:
             await event.respond("Logged out and deleted session successfully.")
         else:
@@ -711,8 +770,7 @@ async def callback_query_handler(event):
         pending_photos[user_id] = True
         await event.respond('Please send the photo you want to set as the thumbnail.')
     elif event.data == b'uploadmethod':
-        user_data = collection.find_one({'user_id': user_id})
-        current_method = user_data.get('upload_method', 'Pyrogram') if user_data else 'Pyrogram'
+        current_method = (await get_settings(user_id)).upload_method
         pyrogram_check = " ✅" if current_method == "Pyrogram" else ""
         telethon_check = " ✅" if current_method == "Telethon" else ""
         buttons = [
@@ -721,19 +779,14 @@ async def callback_query_handler(event):
         ]
         await event.edit("Choose your preferred upload method:\n\n__**Note:** **Crushe ⚡**, built on Telethon(base), still in beta.__", buttons=buttons)
     elif event.data == b'pyrogram':
-        save_user_upload_method(user_id, "Pyrogram")
+        await save_upload_method(user_id, "Pyrogram")
         await event.edit("Upload method set to **Pyrogram** ✅")
     elif event.data == b'telethon':
-        save_user_upload_method(user_id, "Telethon")
+        await save_upload_method(user_id, "Telethon")
         await event.edit("Upload method set to **Crushe ⚡\n\nThanks for choosing this library as it will help me to analyze the error raise issues on github.** ✅")
     elif event.data == b'reset':
         try:
-            user_id_str = str(user_id)
-            collection.update_one({"_id": user_id}, {"$unset": {"delete_words": "", "replacement_words": "", "watermark_text": "", "duration_limit": ""}})
-            collection.update_one({"user_id": user_id}, {"$unset": {"delete_words": "", "replacement_words": "", "watermark_text": "", "duration_limit": ""}})
-            user_chat_ids.pop(user_id, None)
-            user_rename_preferences.pop(user_id_str, None)
-            user_caption_preferences.pop(user_id_str, None)
+            await reset_settings(user_id)
             thumbnail_path = f"{user_id}.jpg"
             if os.path.exists(thumbnail_path):
                 os.remove(thumbnail_path)
@@ -763,17 +816,17 @@ async def handle_user_input(event):
         if session_type == 'setchat':
             try:
                 chat_id = int(event.text)
-                user_chat_ids[user_id] = chat_id
+                await save_preference(user_id, "chat_id", chat_id)
                 await event.respond("Chat ID set successfully!")
             except ValueError:
                 await event.respond("Invalid chat ID!")
         elif session_type == 'setrename':
             custom_rename_tag = event.text
-            await set_rename_command(user_id, custom_rename_tag)
+            await save_preference(user_id, "rename_tag", custom_rename_tag)
             await event.respond(f"Custom rename tag set to: {custom_rename_tag}")
         elif session_type == 'setcaption':
             custom_caption = event.text
-            await set_caption_command(user_id, custom_caption)
+            await save_preference(user_id, "caption", custom_caption)
             await event.respond(f"Custom caption set to: {custom_caption}")
         elif session_type == 'setreplacement':
             match = re.match(r"'(.+)' '(.+)'", event.text)
@@ -781,42 +834,25 @@ async def handle_user_input(event):
                 await event.respond("Usage: 'WORD(s)' 'REPLACEWORD'")
             else:
                 word, replace_word = match.groups()
-                delete_words = load_delete_words(user_id)
-                if word in delete_words:
+                settings = await get_settings(user_id)
+                if word in settings.delete_words:
                     await event.respond(f"The word '{word}' is in the delete set and cannot be replaced.")
                 else:
-                    replacements = load_replacement_words(user_id)
+                    replacements = dict(settings.replacement_words)
                     replacements[word] = replace_word
-                    save_replacement_words(user_id, replacements)
+                    await save_replacement_words(user_id, replacements)
                     await event.respond(f"Replacement saved: '{word}' will be replaced with '{replace_word}'")
         elif session_type == 'addsession':
-            session_data = {
-                "user_id": user_id,
-                "session_string": event.text
-            }
-            mcollection.update_one(
-                {"user_id": user_id},
-                {"$set": session_data},
-                upsert=True
-            )
+            await set_session(user_id, event.text)
             await event.respond("Session string added successfully.")
         elif session_type == 'deleteword':
             words_to_delete = event.message.text.split()
-            delete_words = load_delete_words(user_id)
+            delete_words = set((await get_settings(user_id)).delete_words)
             delete_words.update(words_to_delete)
-            save_delete_words(user_id, delete_words)
+            await save_delete_words(user_id, delete_words)
             await event.respond(f"Words added to delete list: {', '.join(words_to_delete)}")
         del sessions[user_id]
 
-def load_saved_channel_ids():
-    saved_channel_ids = set()
-    try:
-        for channel_doc in collection.find({"channel_id": {"$exists": True}}):
-            saved_channel_ids.add(channel_doc["channel_id"])
-    except Exception as e:
-        print(f"Error loading saved channel IDs: {e}")
-    return saved_channel_ids
-
 @gf.on(events.NewMessage(incoming=True, pattern='/lock'))
 async def lock_command_handler(event):
     if event.sender_id not in OWNER_ID:
@@ -826,7 +862,7 @@ async def lock_command_handler(event):
     except (ValueError, IndexError):
         return await event.respond("Invalid /lock command. Use /lock CHANNEL_ID.")
     try:
-        collection.insert_one({"channel_id": channel_id})
+        await lock_channel(channel_id)
         await event.respond(f"Channel ID {channel_id} locked successfully.")
     except Exception as e:
         await event.respond(f"Error occurred while locking channel ID: {str(e)}")
@@ -873,9 +909,4 @@ def progress_callback(done, total, user_id):
     user_data['previous_time'] = time.time()
     return final
 
-async def add_pdf_watermark(input_pdf, output_pdf_path, watermark_text):
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, add_pdf_watermark_sync, input_pdf, output_pdf_path, watermark_text)
-    return result
-
 # Code completed
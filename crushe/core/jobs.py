@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pyrogram.errors import FloodWait, InternalServerError
+from telethon.errors import FloodWaitError, ServerError
+from config import JOB_WORKERS
+from crushe.core.mongo.jobs_db import (
+    enqueue, claim, renew, requeue, finish, cancel_jobs, create_job_indexes, count_jobs
+)
+
+logger = logging.getLogger(__name__)
+
+
+class JobLease:
+    """A job held by this process. Handlers read ``cancelled`` and save progress through ``checkpoint``."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job = job
+        self.cancelled = False
+        self._fields: Dict[str, Any] = {}
+
+    def checkpoint(self, **payload):
+        """Record progress in the job's payload; it is written with the next lease renewal."""
+        for key, value in payload.items():
+            self.job["payload"][key] = value
+            self._fields[f"payload.{key}"] = value
+
+    async def flush(self) -> bool:
+        fields, self._fields = self._fields, {}
+        alive = await renew(self.job["_id"], JobQueue.OWNER, JobQueue.LEASE, fields)
+        if not alive:
+            self.cancelled = True
+        return alive
+
+
+class JobQueue:
+    """Save requests stored in MongoDB and drained by a pool of workers.
+
+    Handlers only enqueue; a job survives restarts because it is leased rather than taken:
+    a worker that dies stops renewing its lease and the job is picked up again once it runs
+    out. Every user has at most one active job and long batches go back to the end of the
+    queue after each slice, so one big batch cannot hold the workers while others wait.
+    Handlers catch the errors that end a job and let TRANSIENT_ERRORS through: a FloodWait
+    requeues the job for after the wait, anything else is retried up to MAX_ATTEMPTS times
+    (reclaims after a crash included) with a growing delay, then ``on_failed`` is told.
+    """
+
+    # Errors worth running the job again for; OSError covers connection errors and timeouts
+    TRANSIENT_ERRORS = (FloodWait, FloodWaitError, InternalServerError, ServerError, OSError, asyncio.TimeoutError)
+
+    LEASE = 60           # Seconds a job stays ours without a renewal
+    HEARTBEAT = 20       # Seconds between renewals
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 30     # Multiplied by the attempt number
+    POLL_INTERVAL = 5    # Seconds between looks at an empty queue
+
+    OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+    # kind -> handler(job, lease); a handler returns True to be requeued and continue later
+    _handlers: Dict[str, Callable[[Dict[str, Any], JobLease], Awaitable[Optional[bool]]]] = {}
+    # kind -> on_failed(job, error), awaited once a job is given up on
+    _on_failed: Dict[str, Callable[[Dict[str, Any], Exception], Awaitable[None]]] = {}
+    _workers: List[asyncio.Task] = []
+    # user_id -> lease of the job this process is running for them
+    _leases: Dict[int, JobLease] = {}
+    _running = 0
+    _wakeup: Optional[asyncio.Event] = None
+
+    @classmethod
+    def handler(cls, kind: str, on_failed: Optional[Callable[[Dict[str, Any], Exception], Awaitable[None]]] = None):
+        """Register the coroutine function that runs jobs of ``kind``, and what to do when one fails for good."""
+        def decorator(func):
+            cls._handlers[kind] = func
+            if on_failed:
+                cls._on_failed[kind] = on_failed
+            return func
+        return decorator
+
+    @classmethod
+    def _event(cls) -> asyncio.Event:
+        if cls._wakeup is None:
+            cls._wakeup = asyncio.Event()
+        return cls._wakeup
+
+    @classmethod
+    async def submit(cls, user_id: int, kind: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue a job, or return None if the user already has one queued or running."""
+        job = await enqueue(user_id, kind, payload)
+        if job:
+            cls._event().set()
+        return job
+
+    @classmethod
+    async def cancel(cls, user_id: int) -> bool:
+        """Cancel the user's job. Running here it stops right away, elsewhere at its next renewal."""
+        cancelled = await cancel_jobs(user_id)
+        lease = cls._leases.get(user_id)
+        if lease:
+            lease.cancelled = True
+        return bool(cancelled)
+
+    @classmethod
+    async def _heartbeat(cls, lease: JobLease):
+        while True:
+            await asyncio.sleep(cls.HEARTBEAT)
+            try:
+                if not await lease.flush():
+                    logger.info(f"Job {lease.job['_id']} was cancelled or lost its lease")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew job {lease.job['_id']}: {str(e)}")
+
+    @classmethod
+    async def _give_up(cls, job: Dict[str, Any], error: Exception):
+        await finish(job["_id"], cls.OWNER, status="failed", error=str(error))
+        on_failed = cls._on_failed.get(job["kind"])
+        if on_failed:
+            try:
+                await on_failed(job, error)
+            except Exception as e:
+                logger.warning(f"Failure hook of job {job['_id']} raised: {str(e)}")
+
+    @classmethod
+    async def _run(cls, job: Dict[str, Any]):
+        lease = JobLease(job)
+        handler = cls._handlers.get(job["kind"])
+        if handler is None:
+            await finish(job["_id"], cls.OWNER, status="failed", error=f"Unknown job kind {job['kind']}")
+            return
+        if job["attempts"] > cls.MAX_ATTEMPTS:
+            # Reclaimed after its lease ran out every time: the job keeps taking its worker down
+            logger.error(f"Job {job['_id']} ({job['kind']}) never finished in {cls.MAX_ATTEMPTS} attempts")
+            await cls._give_up(job, RuntimeError("the job stopped responding"))
+            return
+        heartbeat = asyncio.create_task(cls._heartbeat(lease))
+        cls._running += 1
+        cls._leases[job["user_id"]] = lease
+        try:
+            more = await handler(job, lease)
+        except (FloodWait, FloodWaitError) as e:
+            wait_time = e.value if isinstance(e, FloodWait) else e.seconds
+            logger.warning(f"Job {job['_id']} ({job['kind']}) hit a FloodWait of {wait_time}s, requeued")
+            # Waiting out a flood is not the job's fault, so it does not use up an attempt
+            await requeue(job["_id"], cls.OWNER, delay=wait_time + 1, fields=lease._fields,
+                          error=str(e), refund_attempt=True)
+            return
+        except Exception as e:
+            logger.error(f"Job {job['_id']} ({job['kind']}) failed on attempt {job['attempts']}: {str(e)}")
+            if job["attempts"] < cls.MAX_ATTEMPTS:
+                await requeue(job["_id"], cls.OWNER, delay=cls.RETRY_DELAY * job["attempts"],
+                              fields=lease._fields, error=str(e))
+            else:
+                await cls._give_up(job, e)
+            return
+        finally:
+            cls._running -= 1
+            cls._leases.pop(job["user_id"], None)
+            heartbeat.cancel()
+
+        if more and not lease.cancelled:
+            # Slice done: save progress and make way for other users' jobs
+            await requeue(job["_id"], cls.OWNER, fields=lease._fields, reset_attempts=True)
+        else:
+            await finish(job["_id"], cls.OWNER, status="cancelled" if lease.cancelled else "done")
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            try:
+                job = await claim(cls.OWNER, cls.LEASE)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                event = cls._event()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=cls.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+                continue
+            try:
+                await cls._run(job)
+            except Exception as e:
+                # The lease runs out and another worker retries the job
+                logger.error(f"Job {job['_id']} could not be settled: {str(e)}")
+
+    @classmethod
+    async def run_workers(cls, count: int = JOB_WORKERS):
+        """Start the workers that drain the queue, including jobs left over from before a restart."""
+        await create_job_indexes()
+        cls._workers = [asyncio.create_task(cls._worker()) for _ in range(count)]
+        logger.info(f"Started {count} job workers as {cls.OWNER}")
+
+    @classmethod
+    async def stats(cls) -> Dict[str, int]:
+        return {
+            "queued": await count_jobs("queued"),
+            "running": await count_jobs("running"),
+            "running_here": cls._running,
+        }
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import MEDIA_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class MediaStage:
+    """Runs CPU-bound media work in a small process pool, off the event loop and away from the GIL.
+
+    At most twice as many jobs as there are processes are handed to the pool at once; any
+    further callers wait on the loop until a slot frees up, so a burst of heavy work queues
+    here (where it is counted) instead of piling up inside the executor.
+    ``func`` and its arguments must be picklable, and ``func`` must live in a module that does
+    not import the crushe package (``tricky.md5_range``, ``media_tasks``): workers come from a
+    fork server and import it themselves, and importing crushe starts the Telegram clients.
+    """
+
+    # Jobs handed to the pool at once; one waiting per process keeps them busy between jobs
+    MAX_IN_FLIGHT = MEDIA_WORKERS * 2
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _slots: Optional[asyncio.Semaphore] = None
+    _waiting = 0
+    _running = 0
+    _completed = 0
+    _failed = 0
+    _wait_total = 0.0
+
+    @classmethod
+    def _pool(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            # Forking this process directly would copy the locks held by its network and
+            # executor threads; the fork server is a clean single-threaded process instead
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["tricky", "media_tasks"])
+            cls._executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=context)
+        return cls._executor
+
+    @classmethod
+    def _get_slots(cls) -> asyncio.Semaphore:
+        if cls._slots is None:
+            cls._slots = asyncio.Semaphore(cls.MAX_IN_FLIGHT)
+        return cls._slots
+
+    @classmethod
+    async def run(cls, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run ``func(*args, **kwargs)`` in the pool once a slot is free and return its result."""
+        queued_at = time.monotonic()
+        cls._waiting += 1
+        try:
+            await cls._get_slots().acquire()
+        finally:
+            cls._waiting -= 1
+        cls._wait_total += time.monotonic() - queued_at
+        cls._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(cls._pool(), functools.partial(func, *args, **kwargs))
+        except Exception:
+            cls._failed += 1
+            raise
+        finally:
+            cls._running -= 1
+            cls._slots.release()
+        cls._completed += 1
+        return result
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Queue depth and totals, for /stats."""
+        finished = cls._completed + cls._failed
+        return {
+            "workers": MEDIA_WORKERS,
+            "running": cls._running,
+            "waiting": cls._waiting,
+            "completed": cls._completed,
+            "failed": cls._failed,
+            "avg_wait": round(cls._wait_total / finished, 2) if finished else 0.0,
+        }
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
@@ -0,0 +1,39 @@
+#crushe
+
+import datetime
+
+from crushe.core.mongo.client import mongo
+
+db = mongo.users
+collection = db.broadcasts
+
+
+async def create_broadcast(from_chat_id, message_id, mode, status_chat_id, status_message_id, total):
+    doc = {
+        "from_chat_id": from_chat_id,
+        "message_id": message_id,
+        "mode": mode,
+        "status_chat_id": status_chat_id,
+        "status_message_id": status_message_id,
+        "total": total,
+        "last_user": 0,
+        "done": 0,
+        "failed": 0,
+        "inactive": 0,
+        "status": "running",
+        "created": datetime.datetime.utcnow(),
+    }
+    result = await collection.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return doc
+
+
+async def save_checkpoint(broadcast_id, last_user, done, failed, inactive, status="running"):
+    await collection.update_one(
+        {"_id": broadcast_id},
+        {"$set": {"last_user": last_user, "done": done, "failed": failed, "inactive": inactive, "status": status}}
+    )
+
+
+async def get_running_broadcasts():
+    return [doc async for doc in collection.find({"status": "running"})]
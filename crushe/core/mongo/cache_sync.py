@@ -0,0 +1,79 @@
+#crushe
+
+import asyncio
+import logging
+
+from config import CACHE_SYNC_INTERVAL
+from crushe.core.cache import _registry
+from crushe.core.mongo.client import mongo
+
+logger = logging.getLogger(__name__)
+
+db = mongo.cache_sync
+collection = db.invalidations
+
+# A single document holds a version counter and the latest invalidations, so one read per
+# poll tells a process everything it missed, in order, without relying on clocks
+LOG_ID = "log"
+LOG_SIZE = 500
+
+# Caches whose entries come from MongoDB and can be changed by another process
+SYNCED_CACHES = ("settings", "premium", "verified", "file_ids", "known_users")
+
+_last_version = None
+
+
+async def invalidate(cache, key):
+    """Drop ``key`` from ``cache`` here and in every other process (front and workers)."""
+    cache.pop(key)
+    entry = {"cache": cache.name, "key": key}
+    await collection.update_one({"_id": LOG_ID}, [
+        {"$set": {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}}},
+        {"$set": {"entries": {"$slice": [
+            {"$concatArrays": [
+                {"$ifNull": ["$entries", []]},
+                [{"$mergeObjects": [{"$literal": entry}, {"version": "$version"}]}],
+            ]},
+            -LOG_SIZE,
+        ]}}},
+    ], upsert=True)
+
+
+async def _read_log():
+    doc = await collection.find_one({"_id": LOG_ID})
+    if not doc:
+        return 0, []
+    return doc.get("version", 0), doc.get("entries", [])
+
+
+async def sync_invalidations():
+    """Apply the invalidations other processes published since the last call."""
+    global _last_version
+    version, entries = await _read_log()
+    if _last_version is None or version < _last_version:
+        # First poll (or the log was reset): nothing cached here predates it
+        _last_version = version
+        return
+    if version == _last_version:
+        return
+    if not entries or entries[0]["version"] > _last_version + 1:
+        # Fell behind the kept log; drop everything that could be stale
+        for name in SYNCED_CACHES:
+            if name in _registry:
+                _registry[name].clear()
+        logger.warning(f"Missed cache invalidations {_last_version + 1}..{version}, cleared caches")
+    else:
+        for entry in entries:
+            if entry["version"] > _last_version and entry["cache"] in _registry:
+                _registry[entry["cache"]].pop(entry["key"])
+    _last_version = version
+
+
+async def run_cache_sync():
+    """Background task that keeps this process's caches in step with writes made elsewhere."""
+    while True:
+        try:
+            await sync_invalidations()
+        except Exception as e:
+            logger.error(f"Error syncing cache invalidations: {str(e)}")
+        await asyncio.sleep(CACHE_SYNC_INTERVAL)
@@ -0,0 +1,13 @@
+#crushe
+
+from config import MONGO_DB, MONGO_POOL_SIZE
+from motor.motor_asyncio import AsyncIOMotorClient as MongoCli
+
+# One connection pool for the whole process; every module takes its database from here
+mongo = MongoCli(
+    MONGO_DB,
+    maxPoolSize=MONGO_POOL_SIZE,
+    maxIdleTimeMS=60000,        # Close sockets idle for a minute
+    serverSelectionTimeoutMS=10000,
+    retryWrites=True,
+)
@@ -1,82 +1,61 @@
 #crushe
 
-from config import MONGO_DB
-from motor.motor_asyncio import AsyncIOMotorClient as MongoCli
+from crushe.core.mongo.client import mongo
 
-mongo = MongoCli(MONGO_DB)
 db = mongo.user_data
 db = db.users_data_db
 
 
 
 
-async def get_data(user_id):
-    x = await db.find_one({"_id": user_id})
+async def get_data(user_id, *fields):
+    """The user's document; pass field names to fetch only those (plus ``_id``)."""
+    projection = {field: 1 for field in fields} or None
+    x = await db.find_one({"_id": user_id}, projection)
     return x
 
 
+async def _set_fields(user_id, fields):
+    # Single round trip: updates the document, or creates it on first use
+    await db.update_one({"_id": user_id}, {"$set": fields}, upsert=True)
+
+
 async def set_thumbnail(user_id, thumb):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"thumb": thumb}})
-    else:
-        await db.insert_one({"_id": user_id, "thumb": thumb})
+    await _set_fields(user_id, {"thumb": thumb})
 
 
 async def set_caption(user_id, caption):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"caption": caption}})
-    else:
-        await db.insert_one({"_id": user_id, "caption": caption})
+    await _set_fields(user_id, {"caption": caption})
 
 
 async def replace_caption(user_id, replace_txt, to_replace):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"replace_txt": replace_txt, "to_replace": to_replace}})
-    else:
-        await db.insert_one({"_id": user_id, "replace_txt": replace_txt, "to_replace": to_replace})
+    await _set_fields(user_id, {"replace_txt": replace_txt, "to_replace": to_replace})
 
 
 async def set_session(user_id, session):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"session": session}})
-    else:
-        await db.insert_one({"_id": user_id, "session": session})
+    await _set_fields(user_id, {"session": session})
 
 
 
 async def clean_words(user_id, new_clean_words):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        existing_words = data.get("clean_words", [])
-        # Ensure existing_words is a list
-        if existing_words is None:
-            existing_words = []
-        updated_words = list(set(existing_words + new_clean_words))
-        await db.update_one({"_id": user_id}, {"$set": {"clean_words": updated_words}})
-    else:
-        await db.insert_one({"_id": user_id, "clean_words": new_clean_words})
+    # Merge on the server; clean_words may be missing or None after all_words_remove
+    await db.update_one(
+        {"_id": user_id},
+        [{"$set": {"clean_words": {"$setUnion": [{"$ifNull": ["$clean_words", []]}, list(new_clean_words)]}}}],
+        upsert=True
+    )
 
 
 async def remove_clean_words(user_id, words_to_remove):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        existing_words = data.get("clean_words", [])
-        updated_words = [word for word in existing_words if word not in words_to_remove]
-        await db.update_one({"_id": user_id}, {"$set": {"clean_words": updated_words}})
-    else:
-        await db.insert_one({"_id": user_id, "clean_words": []})
+    await db.update_one(
+        {"_id": user_id},
+        [{"$set": {"clean_words": {"$setDifference": [{"$ifNull": ["$clean_words", []]}, list(words_to_remove)]}}}],
+        upsert=True
+    )
 
 
 async def set_channel(user_id, chat_id):
-    data = await get_data(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"chat_id": chat_id}})
-    else:
-        await db.insert_one({"_id": user_id, "chat_id": chat_id})
+    await _set_fields(user_id, {"chat_id": chat_id})
 
 
 
@@ -0,0 +1,140 @@
+#crushe
+
+import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from crushe.core.mongo.client import mongo
+
+db = mongo.jobs
+collection = db.jobs
+cooldowns = db.cooldowns
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+async def create_job_indexes():
+    """Indexes for claiming jobs in order, one active job per user, and expiring cooldowns."""
+    await collection.create_index([("status", 1), ("run_after", 1), ("queued_at", 1)])
+    await collection.create_index(
+        "user_id", unique=True, partialFilterExpression={"active": True}, name="one_active_job_per_user"
+    )
+    await cooldowns.create_index("until", expireAfterSeconds=0)
+
+
+async def enqueue(user_id, kind, payload):
+    """Store a new job, or return None if the user already has one queued or running."""
+    now = _now()
+    doc = {
+        "user_id": user_id,
+        "kind": kind,
+        "payload": payload,
+        "status": "queued",
+        "active": True,
+        "attempts": 0,
+        "error": None,
+        "lease_owner": None,
+        "lease_until": None,
+        "run_after": now,
+        "queued_at": now,
+        "created": now,
+    }
+    try:
+        result = await collection.insert_one(doc)
+    except DuplicateKeyError:
+        return None
+    doc["_id"] = result.inserted_id
+    return doc
+
+
+async def get_active_job(user_id):
+    return await collection.find_one({"user_id": user_id, "active": True})
+
+
+async def claim(owner, lease_seconds):
+    """Lease the job that has waited longest, including running jobs whose lease ran out."""
+    now = _now()
+    return await collection.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_after": {"$lte": now}},
+            {"status": "running", "lease_until": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": owner,
+                "lease_until": now + datetime.timedelta(seconds=lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("queued_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def renew(job_id, owner, lease_seconds, fields=None):
+    """Extend a lease and save ``fields``; False once the job was cancelled or leased to someone else."""
+    update = {"lease_until": _now() + datetime.timedelta(seconds=lease_seconds)}
+    update.update(fields or {})
+    result = await collection.update_one(
+        {"_id": job_id, "status": "running", "lease_owner": owner}, {"$set": update}
+    )
+    return result.matched_count == 1
+
+
+async def requeue(job_id, owner, delay=0, fields=None, error=None, reset_attempts=False, refund_attempt=False):
+    """Put a leased job back at the end of the queue, runnable after ``delay`` seconds.
+
+    ``reset_attempts`` starts the attempt count over; ``refund_attempt`` takes back the one this run used.
+    """
+    now = _now()
+    update = {
+        "status": "queued",
+        "lease_owner": None,
+        "lease_until": None,
+        "run_after": now + datetime.timedelta(seconds=delay),
+        "queued_at": now,
+        "error": error,
+    }
+    if reset_attempts:
+        update["attempts"] = 0
+    update.update(fields or {})
+    change = {"$set": update}
+    if refund_attempt and not reset_attempts:
+        change["$inc"] = {"attempts": -1}
+    await collection.update_one({"_id": job_id, "status": "running", "lease_owner": owner}, change)
+
+
+async def finish(job_id, owner, status="done", error=None):
+    await collection.update_one(
+        {"_id": job_id, "status": "running", "lease_owner": owner},
+        {"$set": {"status": status, "error": error, "finished": _now()}, "$unset": {"active": ""}},
+    )
+
+
+async def cancel_jobs(user_id):
+    """Cancel the user's queued or running job; a running one stops at its next lease renewal."""
+    result = await collection.update_many(
+        {"user_id": user_id, "active": True},
+        {"$set": {"status": "cancelled", "finished": _now()}, "$unset": {"active": ""}},
+    )
+    return result.modified_count
+
+
+async def count_jobs(status):
+    return await collection.count_documents({"status": status})
+
+
+async def set_cooldown(user_id, minutes):
+    until = _now() + datetime.timedelta(minutes=minutes)
+    await cooldowns.update_one({"_id": user_id}, {"$set": {"until": until}}, upsert=True)
+
+
+async def get_cooldown(user_id):
+    """End of the user's cooldown, or None if they may send a link now."""
+    doc = await cooldowns.find_one({"_id": user_id})
+    if doc and doc["until"] > _now():
+        return doc["until"]
+    return None
@@ -1,33 +1,45 @@
 import datetime
-from motor.motor_asyncio import AsyncIOMotorClient as MongoCli
-from config import MONGO_DB
+from config import PREMIUM_CACHE_TTL
+from crushe.core.cache import TTLCache
+from crushe.core.mongo.client import mongo
+from crushe.core.mongo.cache_sync import invalidate
 
-mongo = MongoCli(MONGO_DB)
 db = mongo.premium
 db = db.premium_db
 
+# user_id -> True/False, re-read from MongoDB once an entry is older than PREMIUM_CACHE_TTL
+_premium_cache = TTLCache(maxsize=100000, ttl=PREMIUM_CACHE_TTL, name="premium")
+
 async def add_premium(user_id, expire_date):
-    data = await check_premium(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"expire_date": expire_date}})
-    else:
-        await db.insert_one({"_id": user_id, "expire_date": expire_date})
+    await db.update_one({"_id": user_id}, {"$set": {"expire_date": expire_date}}, upsert=True)
+    await invalidate(_premium_cache, user_id)
+    _premium_cache.set(user_id, True)
 
 async def remove_premium(user_id):
     await db.delete_one({"_id": user_id})
+    await invalidate(_premium_cache, user_id)
+    _premium_cache.set(user_id, False)
+
+async def is_premium(user_id):
+    """Cached membership check, avoids reading the whole collection for every request."""
+    premium = _premium_cache.get(user_id)
+    if premium is None:
+        premium = await db.find_one({"_id": user_id}, {"_id": 1}) is not None
+        _premium_cache.set(user_id, premium)
+    return premium
 
 async def check_premium(user_id):
     return await db.find_one({"_id": user_id})
 
 async def premium_users():
     id_list = []
-    async for data in db.find():
+    async for data in db.find({}, {"_id": 1}):
         id_list.append(data["_id"])
     return id_list
 
 async def check_and_remove_expired_users():
     current_time = datetime.datetime.utcnow()
-    async for data in db.find():
+    async for data in db.find({"expire_date": {"$lt": current_time}}, {"expire_date": 1}):
         expire_date = data.get("expire_date")
         if expire_date and expire_date < current_time:
             await remove_premium(data["_id"])
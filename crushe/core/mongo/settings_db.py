@@ -0,0 +1,146 @@
+#crushe
+
+import asyncio
+import logging
+
+from config import SETTINGS_CACHE_TTL, LOCK_SYNC_INTERVAL
+from pymongo import ReturnDocument
+from crushe.core.cache import TTLCache
+from crushe.core.mongo.client import mongo
+from crushe.core.mongo.cache_sync import invalidate
+
+logger = logging.getLogger(__name__)
+
+db = mongo.smart_users
+collection = db.super_user
+
+# user_id -> UserSettings; every write below drops the entry in every process so the next job reloads it
+_settings_cache = TTLCache(maxsize=10000, ttl=SETTINGS_CACHE_TTL, name="settings")
+
+
+class UserSettings:
+    """Per-user options read by the save pipeline. Treat as read-only, it is shared through the cache."""
+
+    def __init__(self, user_id, delete_words=None, replacement_words=None, upload_method="Pyrogram",
+                 chat_id=None, rename_tag=None, caption=None):
+        self.user_id = user_id
+        self.delete_words = frozenset(delete_words or [])
+        self.replacement_words = dict(replacement_words or {})
+        self.upload_method = upload_method
+        self.chat_id = chat_id            # Where saved files go instead of the user's own chat
+        self.rename_tag = rename_tag or ' '
+        self.caption = caption or ''
+
+    def clean(self, text, deleted=""):
+        """Apply the delete and replacement words to a caption or file name."""
+        for word in self.delete_words:
+            text = text.replace(word, deleted)
+        for word, replace_word in self.replacement_words.items():
+            text = text.replace(word, replace_word)
+        return text
+
+
+async def create_settings_index():
+    """Index the legacy {user_id: ...} documents so get_settings never scans the collection."""
+    await collection.create_index("user_id", sparse=True)
+
+
+async def get_settings(user_id):
+    """Return the user's settings, loading them from MongoDB in a single query on a cache miss."""
+    settings = _settings_cache.get(user_id)
+    if settings is not None:
+        return settings
+    # Words are stored on the {_id: user_id} document, the upload method on {user_id: user_id}
+    words_doc, method_doc = {}, {}
+    async for doc in collection.find({"$or": [{"_id": user_id}, {"user_id": user_id}]}):
+        if doc.get("_id") == user_id:
+            words_doc = doc
+        else:
+            method_doc = doc
+    settings = UserSettings(
+        user_id,
+        delete_words=words_doc.get("delete_words"),
+        replacement_words=words_doc.get("replacement_words"),
+        upload_method=method_doc.get("upload_method", "Pyrogram"),
+        chat_id=words_doc.get("chat_id"),
+        rename_tag=words_doc.get("rename_tag"),
+        caption=words_doc.get("caption"),
+    )
+    _settings_cache.set(user_id, settings)
+    return settings
+
+
+async def save_delete_words(user_id, delete_words):
+    await collection.update_one({"_id": user_id}, {"$set": {"delete_words": list(delete_words)}}, upsert=True)
+    await invalidate(_settings_cache, user_id)
+
+
+async def save_replacement_words(user_id, replacements):
+    await collection.update_one({"_id": user_id}, {"$set": {"replacement_words": replacements}}, upsert=True)
+    await invalidate(_settings_cache, user_id)
+
+
+async def save_preference(user_id, field, value):
+    """Store one of the per-user preferences kept on the settings document: chat_id, rename_tag or caption."""
+    await collection.update_one({"_id": user_id}, {"$set": {field: value}}, upsert=True)
+    await invalidate(_settings_cache, user_id)
+
+
+async def save_upload_method(user_id, upload_method):
+    await collection.update_one({"user_id": user_id}, {"$set": {"upload_method": upload_method}}, upsert=True)
+    await invalidate(_settings_cache, user_id)
+
+
+async def reset_settings(user_id):
+    fields = {"delete_words": "", "replacement_words": "", "watermark_text": "", "duration_limit": "",
+              "chat_id": "", "rename_tag": "", "caption": ""}
+    await collection.update_one({"_id": user_id}, {"$unset": fields})
+    await collection.update_one({"user_id": user_id}, {"$unset": fields})
+    await invalidate(_settings_cache, user_id)
+
+
+# Locked channel ids held in memory; bumped version counter tells other nodes to reload
+LOCKS_VERSION_ID = "locked_channels_version"
+_locked_channels = set()
+_locks_version = None
+
+
+def is_channel_locked(chat_id):
+    return chat_id in _locked_channels
+
+
+async def _get_locks_version():
+    doc = await collection.find_one({"_id": LOCKS_VERSION_ID}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+async def load_locked_channels():
+    """Reload the locked channel set from MongoDB."""
+    global _locked_channels, _locks_version
+    version = await _get_locks_version()
+    channels = {doc["channel_id"] async for doc in collection.find({"channel_id": {"$exists": True}}, {"channel_id": 1})}
+    _locked_channels = channels
+    _locks_version = version
+
+
+async def lock_channel(channel_id):
+    global _locks_version
+    await collection.update_one({"channel_id": channel_id}, {"$set": {"channel_id": channel_id}}, upsert=True)
+    _locked_channels.add(channel_id)
+    doc = await collection.find_one_and_update(
+        {"_id": LOCKS_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    # Skip our own bump, but never move backwards past a newer change from another node
+    if _locks_version is not None and doc["version"] == _locks_version + 1:
+        _locks_version = doc["version"]
+
+
+async def run_lock_sync():
+    """Background task that reloads the locked channels whenever another node changes them."""
+    while True:
+        await asyncio.sleep(LOCK_SYNC_INTERVAL)
+        try:
+            if await _get_locks_version() != _locks_version:
+                await load_locked_channels()
+        except Exception as e:
+            logger.error(f"Error syncing locked channels: {str(e)}")
@@ -1,42 +1,90 @@
 #crushe
 
-from config import MONGO_DB
-from motor.motor_asyncio import AsyncIOMotorClient as MongoCli
+import logging
 
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from crushe.core.cache import TTLCache
+from crushe.core.mongo.client import mongo
+from crushe.core.mongo.cache_sync import invalidate
+
+logger = logging.getLogger(__name__)
 
-mongo = MongoCli(MONGO_DB)
 db = mongo.users
 db = db.users_db
 
+# Users already known to be stored (and active), so repeat messages never reach MongoDB
+_known_users = TTLCache(maxsize=100000, ttl=3600, name="known_users")
+
+
+async def create_user_index():
+  """Ensure `user` is unique, dropping duplicate documents left by the old insert path."""
+  try:
+    await db.users.create_index("user", unique=True)
+  except OperationFailure:
+    async for dup in db.users.aggregate([
+      {"$group": {"_id": "$user", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+      {"$match": {"count": {"$gt": 1}}},
+    ]):
+      await db.users.delete_many({"_id": {"$in": dup["ids"][1:]}})
+    await db.users.create_index("user", unique=True)
+
 
 async def get_users():
   user_list = []
-  async for user in db.users.find({"user": {"$gt": 0}}):
+  async for user in db.users.find({"user": {"$gt": 0}}, {"_id": 0, "user": 1}):
     user_list.append(user['user'])
   return user_list
 
 
+async def count_users():
+  return await db.users.count_documents({"user": {"$gt": 0}})
+
+
+async def iter_active_users(after=0, batch_size=1000):
+  """Yield user ids above ``after`` in ascending order, skipping users marked inactive.
+
+  Streams from a cursor, so the whole list is never held in memory; the order lets a
+  broadcast resume from the last id it finished.
+  """
+  cursor = db.users.find(
+    {"user": {"$gt": after}, "inactive": {"$ne": True}}, {"_id": 0, "user": 1}
+  ).sort("user", 1).batch_size(batch_size)
+  async for user in cursor:
+    yield user["user"]
+
+
+async def count_active_users(after=0):
+  return await db.users.count_documents({"user": {"$gt": after}, "inactive": {"$ne": True}})
+
+
+async def mark_inactive(user, reason):
+  """Skip a user who blocked the bot or deleted their account in later broadcasts."""
+  await db.users.update_one({"user": user}, {"$set": {"inactive": True, "inactive_reason": reason}})
+  await invalidate(_known_users, user)  # So add_user reactivates them if they come back
+
+
 async def get_user(user):
-  users = await get_users()
-  if user in users:
+  if user in _known_users:
+    return True
+  if await db.users.find_one({"user": user}, {"_id": 1}):
+    _known_users.set(user, True)
     return True
-  else:
-    return False
+  return False
 
 async def add_user(user):
-  users = await get_users()
-  if user in users:
+  if user in _known_users:
     return
-  else:
-    await db.users.insert_one({"user": user})
+  try:
+    await db.users.update_one(
+      {"user": user}, {"$setOnInsert": {"user": user}, "$unset": {"inactive": "", "inactive_reason": ""}}, upsert=True
+    )
+  except DuplicateKeyError:
+    pass  # Inserted concurrently by another handler
+  _known_users.set(user, True)
 
 
 async def del_user(user):
-  users = await get_users()
-  if not user in users:
-    return
-  else:
-    await db.users.delete_one({"user": user})
+  await db.users.delete_one({"user": user})
+  await invalidate(_known_users, user)
     
 
-
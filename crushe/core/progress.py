@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from pyrogram.errors import FloodWait, MessageIdInvalid, MessageNotModified
+from telethon.errors import FloodWaitError, MessageIdInvalidError, MessageNotModifiedError
+from config import PROGRESS_EDIT_INTERVAL
+from crushe.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressService:
+    """Coalesces progress edits for Pyrogram and Telethon messages.
+
+    Transfers report as often as they like; each message is edited at most once per
+    INTERVAL with the latest state, rendered only when an edit is actually sent. Once a
+    transfer completes its pending edit is dropped, since the caller takes the message over.
+    Unchanged text is never re-sent, a FloodWait pushes the message's next edit
+    back and slows its interval down, and a message that is gone or can no longer be
+    edited is dropped for the rest of the transfer.
+    """
+
+    # Seconds between two edits of the same message, and how far FloodWaits may stretch it
+    INTERVAL = PROGRESS_EDIT_INTERVAL
+    MAX_INTERVAL = 60
+
+    # (chat_id, message_id) -> transfer state; abandoned transfers expire on their own
+    _state = TTLCache(maxsize=5000, ttl=3600, name="progress")
+    # Messages that can no longer be edited; reports for them are ignored
+    _dropped = TTLCache(maxsize=5000, ttl=3600, name="progress_dropped")
+
+    @staticmethod
+    def _key(message: Any) -> Hashable:
+        chat_id = getattr(message, "chat_id", None)
+        if chat_id is None:
+            chat_id = message.chat.id
+        return (chat_id, message.id)
+
+    @classmethod
+    def report(cls, message: Any, current: int, total: int, render: Callable[[int, int], str]):
+        """Record progress for ``message``; ``render(current, total)`` builds the text when it is time to edit."""
+        key = cls._key(message)
+        if key in cls._dropped:
+            return
+        if total and current >= total:
+            # The caller edits or deletes the message next; a late progress edit would overwrite it
+            cls.finish(message)
+            return
+        state = cls._state.get(key)
+        if state is None:
+            state = {
+                "text": None,
+                "next_edit": 0.0,
+                "interval": cls.INTERVAL,
+                "version": 0,
+                "task": None,
+                "started": time.monotonic(),
+            }
+            cls._state.set(key, state)
+        state.update(message=message, current=current, total=total, render=render)
+        state["version"] += 1
+        if state["task"] is None or state["task"].done():
+            state["task"] = asyncio.create_task(cls._flush(state))
+
+    @classmethod
+    def finish(cls, message: Any):
+        """Stop tracking ``message`` and drop any edit still pending for it."""
+        state = cls._state.pop(cls._key(message))
+        if state and state["task"] and not state["task"].done():
+            state["task"].cancel()
+
+    @classmethod
+    def hook(cls, message: Any, render: Callable[[int, int], str]) -> Callable[[int, int], Any]:
+        """Progress callback ``(current, total)`` that reports to ``message``."""
+        async def progress(current, total):
+            cls.report(message, current, total, render)
+        return progress
+
+    @classmethod
+    async def _flush(cls, state: Dict[str, Any]):
+        while True:
+            delay = state["next_edit"] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            version = state["version"]
+            try:
+                text = state["render"](state["current"], state["total"])
+                if text != state["text"]:
+                    await state["message"].edit(text)
+                    state["text"] = text
+                state["next_edit"] = time.monotonic() + state["interval"]
+            except (FloodWait, FloodWaitError) as e:
+                wait_time = e.value if isinstance(e, FloodWait) else e.seconds
+                state["interval"] = min(cls.MAX_INTERVAL, state["interval"] * 2)
+                state["next_edit"] = time.monotonic() + wait_time + state["interval"]
+                logger.warning(f"FloodWait of {wait_time}s on progress edit, interval now {state['interval']}s")
+                # The text never made it, so try again once the wait is over
+                continue
+            except (MessageIdInvalid, MessageNotModified, MessageIdInvalidError, MessageNotModifiedError) as e:
+                # Deleted or edited elsewhere; later reports for it are ignored
+                logger.debug(f"Progress message dropped: {str(e)}")
+                cls._dropped.set(cls._key(state["message"]), True)
+                cls.finish(state["message"])
+                return
+            except Exception as e:
+                logger.debug(f"Progress edit skipped: {str(e)}")
+                state["next_edit"] = time.monotonic() + state["interval"]
+            # Updates that arrived while we were editing still need to be shown
+            if state["version"] == version:
+                return
@@ -0,0 +1,54 @@
+import time
+from typing import Hashable, Optional, Tuple
+
+from config import RATE_LIMIT_GLOBAL
+from crushe.core.cache import TTLCache
+
+
+class RateLimiter:
+    """GCRA limiter: ``rate`` requests per ``period`` seconds, allowing bursts of up to ``burst``.
+
+    Each key only stores its theoretical arrival time (one float), which expires as soon as
+    the key is back to a full burst allowance.
+    """
+
+    def __init__(self, rate: float, period: float = 1.0, burst: int = 1, name: Optional[str] = None,
+                 maxsize: int = 10000):
+        # Seconds between requests at the sustained rate, and how far ahead a burst may run
+        self.interval = period / rate
+        self.tolerance = self.interval * (max(1, burst) - 1)
+        self._tat = TTLCache(maxsize=maxsize, name=name)
+
+    def delay(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Seconds until a request for ``key`` would be allowed, without reserving it."""
+        now = time.monotonic() if now is None else now
+        tat = self._tat.get(key)
+        if tat is None:
+            return 0.0
+        return max(0.0, tat - self.tolerance - now)
+
+    def commit(self, key: Hashable, at: float):
+        """Record a request for ``key`` sent at monotonic time ``at``."""
+        tat = max(self._tat.get(key, at), at) + self.interval
+        self._tat.set(key, tat, ttl=max(0.0, tat - time.monotonic()))
+
+    def reserve(self, key: Hashable) -> float:
+        """Reserve the next slot for ``key`` and return how long to wait before using it."""
+        return reserve((self, key))
+
+
+def reserve(*limits: Tuple[RateLimiter, Hashable]) -> float:
+    """Reserve one request on every ``(limiter, key)`` level and return the exact wait in seconds.
+
+    The request is placed at the earliest time all levels allow, so concurrent callers queue
+    behind each other instead of polling.
+    """
+    now = time.monotonic()
+    wait = max((limiter.delay(key, now) for limiter, key in limits), default=0.0)
+    for limiter, key in limits:
+        limiter.commit(key, now + wait)
+    return wait
+
+
+# Everything this bot sends through Telegram shares one budget
+bot_limiter = RateLimiter(rate=RATE_LIMIT_GLOBAL, period=1.0, burst=RATE_LIMIT_GLOBAL, name="rate_global")
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyrogram import Client
+from config import API_ID, API_HASH, SECONDS, USERBOT_POOL_SIZE, USERBOT_IDLE_TIMEOUT
+from crushe.core.flood import FloodScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class UserbotPool:
+    """Keeps one started userbot Client per user session and shares it between single links and batches."""
+
+    # (user_id, session_string) -> {"client", "refs", "last_used", "ready"}
+    _sessions: Dict[Tuple[int, str], Dict[str, Any]] = {}
+
+    # Created lazily so it binds to the running loop
+    _cond: Optional[asyncio.Condition] = None
+
+    # Maximum number of userbot connections kept on this node
+    MAX_SESSIONS = USERBOT_POOL_SIZE
+
+    # Idle sessions are stopped after this many seconds
+    IDLE_TIMEOUT = USERBOT_IDLE_TIMEOUT
+
+    # How often the sweeper looks for idle sessions
+    SWEEP_INTERVAL = 60
+
+    @classmethod
+    def _condition(cls) -> asyncio.Condition:
+        if cls._cond is None:
+            cls._cond = asyncio.Condition()
+        return cls._cond
+
+    @staticmethod
+    def _build_client(session_string: str) -> Client:
+        device = 'Vivo Y20'
+        client = Client(
+            ":userbot:",
+            api_id=API_ID,
+            api_hash=API_HASH,
+            device_model=device,
+            session_string=session_string,
+            # Add connection settings to improve reliability
+            flood_sleep_threshold=SECONDS,  # Sleep on FloodWait up to SECONDS
+            retry_delay=1,             # Initial retry delay
+            max_retries=5,             # Maximum number of retries
+            no_updates=True,           # Disable updates to reduce overhead
+            workers=4                  # Limit number of workers to prevent overloading
+        )
+        FloodScheduler.install(client)
+        return client
+
+    @classmethod
+    def _pop_idle(cls, predicate) -> List[Client]:
+        """Remove idle entries matching ``predicate`` and return their clients. Caller holds the lock."""
+        keys = [key for key, entry in cls._sessions.items()
+                if entry["refs"] == 0 and entry["ready"].done() and predicate(key, entry)]
+        return [cls._sessions.pop(key)["client"] for key in keys]
+
+    @staticmethod
+    async def _stop_all(clients: List[Client]):
+        for client in clients:
+            try:
+                if client.is_connected:
+                    await client.stop()
+            except Exception as e:
+                logger.error(f"Error stopping pooled userbot: {str(e)}")
+
+    @classmethod
+    async def acquire(cls, user_id: int, session_string: str) -> Client:
+        """Return a started userbot for this session, starting it on first use."""
+        key = (user_id, session_string)
+        cond = cls._condition()
+        to_stop = []
+        starter = False
+        async with cond:
+            while True:
+                entry = cls._sessions.get(key)
+                if entry:
+                    entry["refs"] += 1
+                    entry["last_used"] = time.time()
+                    break
+                if len(cls._sessions) >= cls.MAX_SESSIONS:
+                    # Make room by dropping the least recently used idle session
+                    idle = [(e["last_used"], k) for k, e in cls._sessions.items()
+                            if e["refs"] == 0 and e["ready"].done()]
+                    if idle:
+                        oldest = min(idle)[1]
+                        to_stop.extend(cls._pop_idle(lambda k, e: k == oldest))
+                if len(cls._sessions) < cls.MAX_SESSIONS:
+                    entry = {
+                        "client": cls._build_client(session_string),
+                        "refs": 1,
+                        "last_used": time.time(),
+                        "ready": asyncio.get_running_loop().create_future(),
+                    }
+                    cls._sessions[key] = entry
+                    starter = True
+                    break
+                await cond.wait()
+        await cls._stop_all(to_stop)
+
+        if not starter:
+            # Someone else is starting this session; wait for them
+            await asyncio.shield(entry["ready"])
+            return entry["client"]
+
+        try:
+            await entry["client"].start()
+            entry["ready"].set_result(True)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                entry["ready"].set_exception(e)
+                entry["ready"].exception()  # Mark as retrieved, waiters still see it
+            else:
+                entry["ready"].cancel()
+            async with cond:
+                cls._sessions.pop(key, None)
+                cond.notify_all()
+            raise
+        return entry["client"]
+
+    @classmethod
+    async def release(cls, user_id: int, session_string: str):
+        """Hand a userbot back to the pool. It stays connected until it has been idle for IDLE_TIMEOUT."""
+        cond = cls._condition()
+        async with cond:
+            entry = cls._sessions.get((user_id, session_string))
+            if entry and entry["refs"] > 0:
+                entry["refs"] -= 1
+                entry["last_used"] = time.time()
+            cond.notify_all()
+
+    @classmethod
+    @asynccontextmanager
+    async def session(cls, user_id: int, session_string: str):
+        """Async context manager around ``acquire``/``release``."""
+        client = await cls.acquire(user_id, session_string)
+        try:
+            yield client
+        finally:
+            await cls.release(user_id, session_string)
+
+    @classmethod
+    async def close(cls, user_id: int):
+        """Stop every idle session of a user, e.g. after logout."""
+        cond = cls._condition()
+        async with cond:
+            to_stop = cls._pop_idle(lambda k, e: k[0] == user_id)
+            cond.notify_all()
+        await cls._stop_all(to_stop)
+
+    @classmethod
+    async def sweep(cls):
+        """Stop sessions that have been idle for longer than IDLE_TIMEOUT."""
+        cutoff = time.time() - cls.IDLE_TIMEOUT
+        cond = cls._condition()
+        async with cond:
+            to_stop = cls._pop_idle(lambda k, e: e["last_used"] < cutoff)
+            cond.notify_all()
+        if to_stop:
+            logger.info(f"Stopping {len(to_stop)} idle userbot session(s)")
+        await cls._stop_all(to_stop)
+
+    @classmethod
+    async def run_sweeper(cls):
+        """Background task that evicts idle sessions."""
+        while True:
+            await asyncio.sleep(cls.SWEEP_INTERVAL)
+            try:
+                await cls.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping userbot pool: {str(e)}")
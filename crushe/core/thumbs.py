@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+from config import THUMB_WORKERS
+from crushe.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+THUMB_DIR = "thumbs/"
+
+# Thumbnails kept on disk; older files are removed once the directory grows past this
+MAX_THUMBS = 512
+
+# file_unique_id -> thumbnail path, so a video sent again (or by another user) reuses its thumb
+_thumb_cache = TTLCache(maxsize=MAX_THUMBS, ttl=6 * 3600, name="thumbs")
+
+# Limits the ffmpeg frame grabs running at once; created lazily so it binds to the running loop
+_grab_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _grab_slots
+    if _grab_slots is None:
+        _grab_slots = asyncio.Semaphore(THUMB_WORKERS)
+    return _grab_slots
+
+
+def _prune():
+    """Drop the oldest thumbnails once THUMB_DIR holds more than MAX_THUMBS files."""
+    try:
+        entries = sorted(os.scandir(THUMB_DIR), key=lambda e: e.stat().st_mtime)
+    except FileNotFoundError:
+        return
+    for entry in entries[:max(0, len(entries) - MAX_THUMBS)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+async def _download_telegram_thumb(client, media, path) -> Optional[str]:
+    """Download the thumbnail Telegram already generated for ``media`` (a few KB)."""
+    thumbs = getattr(media, "thumbs", None)
+    if not client or not thumbs:
+        return None
+    # Thumbs are ordered from smallest to largest
+    try:
+        result = await client.download_media(thumbs[-1].file_id, file_name=path)
+    except Exception as e:
+        logger.warning(f"Could not download Telegram thumbnail: {str(e)}")
+        return None
+    return result if result and os.path.isfile(result) else None
+
+
+async def grab_frame(video, duration, path) -> Optional[str]:
+    """Extract one frame from the middle of ``video`` with ffmpeg."""
+    time_stamp = time.strftime('%H:%M:%S', time.gmtime(int(duration or 0) / 2))
+    cmd = [
+        "ffmpeg",
+        "-ss", time_stamp,  # Before -i, so ffmpeg seeks instead of decoding up to the frame
+        "-i", video,
+        "-frames:v", "1",
+        "-vf", "scale=320:-2",
+        "-y", path,
+    ]
+    async with _slots():
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(process.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return None
+    return path if os.path.isfile(path) else None
+
+
+async def get_thumbnail(video, duration, sender, client=None, media=None, grab=True) -> Optional[str]:
+    """Thumbnail for an upload.
+
+    The user's own thumbnail wins, then the one Telegram made for the source ``media``
+    (downloaded through ``client``), then a frame grabbed from ``video`` if ``grab`` is set.
+    """
+    if os.path.exists(f'{sender}.jpg'):
+        return f'{sender}.jpg'
+
+    key = getattr(media, "file_unique_id", None)
+    if key:
+        cached = _thumb_cache.get(key)
+        if cached and os.path.isfile(cached):
+            return cached
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    path = os.path.join(THUMB_DIR, f"{key or uuid.uuid4().hex}.jpg")
+    thumb = await _download_telegram_thumb(client, media, path)
+    if not thumb and grab and video:
+        thumb = await grab_frame(video, duration, path)
+    if not thumb:
+        return None
+
+    if key:
+        _thumb_cache.set(key, thumb)
+    await asyncio.to_thread(_prune)
+    return thumb
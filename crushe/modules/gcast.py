@@ -4,81 +4,35 @@ import asyncio
 from pyrogram import filters
 from config import OWNER_ID
 from crushe import app
-from crushe.core.mongo.users_db import get_users
+from crushe.core.broadcast import Broadcast
+from crushe.core.mongo.users_db import count_active_users
+from crushe.core.mongo.broadcast_db import create_broadcast
 
-async def send_msg(user_id, message):
-    try:
-        await message.copy(chat_id=user_id)
-    except FloodWait as e:
-        await asyncio.sleep(e.x)
-        return send_msg(user_id, message)
-    except InputUserDeactivated:
-        return 400, f"{user_id} : deactivated\n"
-    except UserIsBlocked:
-        return 400, f"{user_id} : blocked the bot\n"
-    except PeerIdInvalid:
-        return 400, f"{user_id} : user id invalid\n"
-    except Exception:
-        return 500, f"{user_id} : {traceback.format_exc()}\n"
+
+async def start_broadcast(message, mode):
+    exmsg = await message.reply_text("sᴛᴀʀᴛᴇᴅ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ!")
+    doc = await create_broadcast(
+        from_chat_id=message.chat.id,
+        message_id=message.reply_to_message.id,
+        mode=mode,
+        status_chat_id=exmsg.chat.id,
+        status_message_id=exmsg.id,
+        total=await count_active_users(),
+    )
+    # Runs on its own so the owner's other commands are not held up
+    asyncio.create_task(Broadcast(app, doc, exmsg).run())
 
 
 @app.on_message(filters.command("gcast") & filters.user(OWNER_ID))
 async def broadcast(_, message):
     if not message.reply_to_message:
         await message.reply_text("ʀᴇᴘʟʏ ᴛᴏ ᴀ ᴍᴇssᴀɢᴇ ᴛᴏ ʙʀᴏᴀᴅᴄᴀsᴛ ɪᴛ.")
-        return    
-    exmsg = await message.reply_text("sᴛᴀʀᴛᴇᴅ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ!")
-    all_users = (await get_users()) or {}
-    done_users = 0
-    failed_users = 0
-    
-    for user in all_users:
-        try:
-            await send_msg(user, message.reply_to_message)
-            done_users += 1
-            await asyncio.sleep(0.1)
-        except Exception:
-            pass
-            failed_users += 1
-    if failed_users == 0:
-        await exmsg.edit_text(
-            f"**sᴜᴄᴄᴇssғᴜʟʟʏ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ ✅**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done_users}` **ᴜsᴇʀs**",
-        )
-    else:
-        await exmsg.edit_text(
-            f"**sᴜᴄᴄᴇssғᴜʟʟʏ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ ✅**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done_users}` **ᴜsᴇʀs**\n\n**ɴᴏᴛᴇ:-** `ᴅᴜᴇ ᴛᴏ sᴏᴍᴇ ɪssᴜᴇ ᴄᴀɴ'ᴛ ᴀʙʟᴇ ᴛᴏ ʙʀᴏᴀᴅᴄᴀsᴛ` `{failed_users}` **ᴜsᴇʀs**",
-        )
-
-
-
+        return
+    await start_broadcast(message, "copy")
 
 
 @app.on_message(filters.command("announce") & filters.user(OWNER_ID))
 async def announced(_, message):
-    if message.reply_to_message:
-      to_send=message.reply_to_message.id
     if not message.reply_to_message:
       return await message.reply_text("Reply To Some Post To Broadcast")
-    users = await get_users() or []
-    print(users)
-    failed_user = 0
-  
-    for user in users:
-      try:
-        await _.forward_messages(chat_id=int(user), from_chat_id=message.chat.id, message_ids=to_send)
-        await asyncio.sleep(1)
-      except Exception as e:
-        failed_user += 1
-          
-    if failed_users == 0:
-        await exmsg.edit_text(
-            f"**sᴜᴄᴄᴇssғᴜʟʟʏ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ ✅**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done_users}` **ᴜsᴇʀs**",
-        )
-    else:
-        await exmsg.edit_text(
-            f"**sᴜᴄᴄᴇssғᴜʟʟʏ ʙʀᴏᴀᴅᴄᴀsᴛɪɴɢ ✅**\n\n**sᴇɴᴛ ᴍᴇssᴀɢᴇ ᴛᴏ** `{done_users}` **ᴜsᴇʀs**\n\n**ɴᴏᴛᴇ:-** `ᴅᴜᴇ ᴛᴏ sᴏᴍᴇ ɪssᴜᴇ ᴄᴀɴ'ᴛ ᴀʙʟᴇ ᴛᴏ ʙʀᴏᴀᴅᴄᴀsᴛ` `{failed_users}` **ᴜsᴇʀs**",
-        )
-
-
-
-
+    await start_broadcast(message, "forward")
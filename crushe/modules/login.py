@@ -9,6 +9,7 @@ import os
 import string
 from crushe.core.mongo import db
 from crushe.core.func import subscribe, chk_user
+from crushe.core.session_pool import UserbotPool
 from config import API_ID as api_id, API_HASH as api_hash
 from pyrogram.errors import (
     ApiIdInvalid,
@@ -47,6 +48,7 @@ async def delete_session_files(user_id):
 async def clear_db(client, message):
     user_id = message.chat.id
     files_deleted = await delete_session_files(user_id)
+    await UserbotPool.close(user_id)
 
     if files_deleted:
         await message.reply("✅ Your session data and files have been cleared from memory and disk.")
@@ -7,12 +7,13 @@ import aiohttp
 from crushe import app
 from crushe.core.func import *
 from datetime import datetime, timedelta
-from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGO_DB, WEBSITE_URL, AD_API # you can edit this by any short link provider
+from config import WEBSITE_URL, AD_API, PREMIUM_CACHE_TTL # you can edit this by any short link provider
+from crushe.core.cache import TTLCache
+from crushe.core.mongo.cache_sync import invalidate
+from crushe.core.mongo.client import mongo
 
 # MongoDB setup
-tclient = AsyncIOMotorClient(MONGO_DB)
-tdb = tclient["telegram_bot"]
+tdb = mongo["telegram_bot"]
 token = tdb["tokens"]
 
 # Create a TTL index for sessions collection
@@ -23,6 +24,9 @@ async def create_ttl_index():
 # In-memory parameter storage
 Param = {}
 
+# user_id -> token expiry (False when the user has no token)
+_verified_cache = TTLCache(maxsize=100000, ttl=PREMIUM_CACHE_TTL, name="verified")
+
 
 async def generate_random_param(length=8):
     """Generate a random parameter."""
@@ -44,8 +48,12 @@ async def get_shortened_url(deep_link):
 
 async def is_user_verified(user_id):
     """Check if a user has an active session."""
-    session = await token.find_one({"user_id": user_id})
-    return session is not None
+    expires_at = _verified_cache.get(user_id)
+    if expires_at is None:
+        session = await token.find_one({"user_id": user_id}, {"expires_at": 1})
+        expires_at = (session.get("expires_at") or datetime.max) if session else False
+        _verified_cache.set(user_id, expires_at)
+    return bool(expires_at) and expires_at > datetime.utcnow()
 
 
 @app.on_message(filters.command("start"))
@@ -87,12 +95,16 @@ async def token_handler(client, message):
     if param:
         if user_id in Param and Param[user_id] == param:
             # Add user to MongoDB as a verified user for the next 6 hours
+            expires_at = datetime.utcnow() + timedelta(hours=3)
             await token.insert_one({
                 "user_id": user_id,
                 "param": param,
                 "created_at": datetime.utcnow(),
-                "expires_at": datetime.utcnow() + timedelta(hours=3),
+                "expires_at": expires_at,
             })
+            # Workers may still hold the old "not verified" answer
+            await invalidate(_verified_cache, user_id)
+            _verified_cache.set(user_id, expires_at)
             del Param[user_id]  # Remove the parameter from Param
             await message.reply("✅ You have been verified successfully! Enjoy your session for next 3 hours.")
             return
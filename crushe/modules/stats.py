@@ -3,8 +3,10 @@
 from crushe import app
 from pyrogram import filters
 from config import OWNER_ID
-from crushe.core.mongo.users_db import get_users, add_user, get_user
+from crushe.core.mongo.users_db import count_users, add_user
 from crushe.core.mongo.plans_db import premium_users
+from crushe.core.media_stage import MediaStage
+from crushe.core.jobs import JobQueue
 
 
 
@@ -13,23 +15,27 @@ from crushe.core.mongo.plans_db import premium_users
 async def chat_watcher_func(_, message):
     try:
         if message.from_user:
-            us_in_db = await get_user(message.from_user.id)
-            if not us_in_db:
-                await add_user(message.from_user.id)
+            # add_user is an upsert and skips users it has already seen
+            await add_user(message.from_user.id)
     except:
         pass
 
 
 @app.on_message(filters.command("stats"))
 async def stats(client, message):
-    users = len(await get_users())
+    users = await count_users()
     premium = await premium_users()
+    jobs = await JobQueue.stats()
+    media = MediaStage.stats()
     await message.reply_text(f"""
 **Total Stats of** {(await client.get_me()).mention} :
 
 **Total Users** : {users}
 **Premium Users** : {len(premium)}
 
+**Jobs** : {jobs["running"]} running, {jobs["queued"]} queued
+**Media Queue** : {media["running"]} in {media["workers"]} processes, {media["waiting"]} waiting (avg wait {media["avg_wait"]}s)
+
 **__All Set ✅__**
 """)
   
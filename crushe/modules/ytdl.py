@@ -7,20 +7,21 @@ import random
 import string
 import requests
 import logging
-import cv2
 from crushe import sex as client
 from pyrogram import Client,filters
 from telethon import events
 from telethon.sync import TelegramClient
 from telethon.tl.types import DocumentAttributeVideo
-from crushe.core.func import screenshot, video_metadata
+from crushe.core.func import video_metadata
+from crushe.core.thumbs import get_thumbnail
+from crushe.core.progress import ProgressService
+from crushe.core.media_stage import MediaStage
+from media_tasks import tag_mp3
 from telethon.tl.functions.messages import EditMessageRequest
 from tricky import fast_upload
 from concurrent.futures import ThreadPoolExecutor
 import aiohttp  # For async thumbnail downloading
 import logging
-from mutagen.id3 import ID3, TIT2, TPE1, COMM, APIC
-from mutagen.mp3 import MP3
 
 logger = logging.getLogger(__name__)
 
@@ -97,28 +98,19 @@ async def process_audio(client, event, url, cookies_env_var=None):
 
         # Edit metadata asynchronously
         if os.path.exists(download_path):
-            def edit_metadata():
-                audio_file = MP3(download_path, ID3=ID3)
-                try:
-                    audio_file.add_tags()
-                except Exception:
-                    pass
-                audio_file.tags["TIT2"] = TIT2(encoding=3, text=title)
-                audio_file.tags["TPE1"] = TPE1(encoding=3, text="Team Crushe")
-                audio_file.tags["COMM"] = COMM(encoding=3, lang="eng", desc="Comment", text="Processed by Team Crushe")
-                
-                thumbnail_url = info_dict.get('thumbnail')
-                if thumbnail_url:
-                    thumbnail_path = os.path.join("static", "crushe.jpg")
-                    asyncio.run(download_thumbnail_async(thumbnail_url, thumbnail_path))
-                    with open(thumbnail_path, 'rb') as img:
-                        audio_file.tags["APIC"] = APIC(
-                            encoding=3, mime='image/jpeg', type=3, desc='Cover', data=img.read()
-                        )
+            # The cover is fetched here on the loop; only the tagging itself goes to the pool
+            thumbnail_path = None
+            thumbnail_url = info_dict.get('thumbnail')
+            if thumbnail_url:
+                thumbnail_path = os.path.join("static", f"{get_random_string()}.jpg")
+                await download_thumbnail_async(thumbnail_url, thumbnail_path)
+                if not os.path.exists(thumbnail_path):
+                    thumbnail_path = None
+            try:
+                await MediaStage.run(tag_mp3, download_path, title, thumbnail_path)
+            finally:
+                if thumbnail_path:
                     os.remove(thumbnail_path)
-                audio_file.save()
-            
-            await asyncio.to_thread(edit_metadata)
 
         # await progress_message.edit("**__Starting Upload...__**")
 
@@ -129,9 +121,8 @@ async def process_audio(client, event, url, cookies_env_var=None):
             prog = await client.send_message(chat_id, "**__Starting Upload...__**")
             uploaded = await fast_upload(
                 client, download_path, 
-                reply=prog, 
                 name=None,
-                progress_bar_function=lambda done, total: progress_callback(done, total, chat_id)
+                progress_hook=ProgressService.hook(prog, lambda done, total: progress_callback(done, total, chat_id))
             )
             await client.send_file(chat_id, uploaded, caption=f"**{title}**\n\n**__Powered by Team Crushe__**")
             if prog:
@@ -339,7 +330,7 @@ async def process_video(client, event, url, cookies_env_var, check_duration_and_
         # Proceed with the download
         await asyncio.to_thread(download_video, url, ydl_opts)
         title = info_dict.get('title', 'Powered by Team Crushe')
-        k = video_metadata(download_path)      
+        k = await video_metadata(download_path)      
         W = k['width']
         H = k['height']
         D = k['duration']
@@ -359,7 +350,7 @@ async def process_video(client, event, url, cookies_env_var, check_duration_and_
         if thumbnail_file:
             THUMB = thumbnail_file
         else:
-            THUMB = await screenshot(download_path, metadata['duration'], event.sender_id)
+            THUMB = await get_thumbnail(download_path, metadata['duration'], event.sender_id)
 
         # await progress_message.edit("**__Uploading video...__**")
 
@@ -370,8 +361,7 @@ async def process_video(client, event, url, cookies_env_var, check_duration_and_
             prog = await client.send_message(chat_id, "**__Starting Upload...__**")
             uploaded = await fast_upload(
                 client, download_path,
-                reply=prog,
-                progress_bar_function=lambda done, total: progress_callback(done, total, chat_id)
+                progress_hook=ProgressService.hook(prog, lambda done, total: progress_callback(done, total, chat_id))
             )
             await client.send_file(
                 event.chat_id,
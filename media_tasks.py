@@ -0,0 +1,26 @@
+"""CPU-bound media helpers run in MediaStage's worker processes.
+
+Workers import this module on their own, so it must never import the crushe package:
+doing so would start the Telegram clients in every worker.
+"""
+
+from mutagen.id3 import ID3, TIT2, TPE1, COMM, APIC
+from mutagen.mp3 import MP3
+
+
+def tag_mp3(path, title, cover_path=None):
+    """Write our ID3 tags (and cover art) into ``path``. Runs in a media pool process."""
+    audio_file = MP3(path, ID3=ID3)
+    try:
+        audio_file.add_tags()
+    except Exception:
+        pass
+    audio_file.tags["TIT2"] = TIT2(encoding=3, text=title)
+    audio_file.tags["TPE1"] = TPE1(encoding=3, text="Team Crushe")
+    audio_file.tags["COMM"] = COMM(encoding=3, lang="eng", desc="Comment", text="Processed by Team Crushe")
+    if cover_path:
+        with open(cover_path, 'rb') as img:
+            audio_file.tags["APIC"] = APIC(
+                encoding=3, mime='image/jpeg', type=3, desc='Cover', data=img.read()
+            )
+    audio_file.save()
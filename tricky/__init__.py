@@ -1,4 +1,5 @@
 import sys
+import io
 import os
 import pathlib
 import time
@@ -9,9 +10,10 @@ import logging
 import math
 import asyncio
 from collections import defaultdict
-from typing import AsyncGenerator, Awaitable, BinaryIO, DefaultDict, List, Optional, Tuple, Union
+from typing import AsyncGenerator, AsyncIterator, Awaitable, BinaryIO, Callable, DefaultDict, Dict, List, Optional, Set, Tuple, Union
 from telethon import TelegramClient, helpers, utils
 from telethon.crypto import AuthKey
+from telethon.errors import FileReferenceExpiredError, FileReferenceInvalidError, FloodWaitError
 from telethon.network import MTProtoSender
 from telethon.tl.alltlobjects import LAYER
 from telethon.tl.functions import InvokeWithLayerRequest
@@ -20,6 +22,11 @@ from telethon.tl.functions.upload import GetFileRequest, SaveBigFilePartRequest,
 from telethon.tl.types import Document, InputDocumentFileLocation, InputFile, InputFileBig, InputFileLocation, InputPeerPhotoFileLocation, InputPhotoFileLocation, TypeInputFile
 
 sys.path.insert(0, f"{pathlib.Path(__file__).parent.resolve()}")
+from .journal import PartJournal
+
+# Telegram drops parts of unfinished uploads after a while, so older upload journals are ignored
+UPLOAD_RESUME_SECONDS = 6 * 60 * 60
+
 class Timer:
     def __init__(self, time_between=5):
         self.start_time = time.time()
@@ -46,7 +53,8 @@ def human_readable_size(size, decimal_places=2):
         size /= 1024.0
     return f"{size:.{decimal_places}f} {unit}"
 
-async def fast_download(client, msg, reply = None, download_folder = None, progress_bar_function = progress_bar_str):
+async def fast_download(client, msg, reply = None, download_folder = None, progress_bar_function = progress_bar_str, progress_hook = None):
+    # progress_hook(done, total), if given, replaces the Timer-throttled reply.edit progress
     timer = Timer()
 
     async def progress_bar(downloaded_bytes, total_bytes):
@@ -70,13 +78,16 @@ async def fast_download(client, msg, reply = None, download_folder = None, progr
     else:
         download_location = download_folder + filename 
 
-    with open(download_location, "wb") as f:
-        if reply != None:
+    # Keep what an interrupted attempt already wrote; download_file resumes from its journal
+    resumable = os.path.exists(download_location) and PartJournal(
+        _download_journal_key(file, file.size, download_location)).exists()
+    with open(download_location, "r+b" if resumable else "wb") as f:
+        if progress_hook != None or reply != None:
             await download_file(
                 client=client, 
                 location=file, 
                 out=f,
-                progress_callback=progress_bar
+                progress_callback=progress_hook or progress_bar
             )
         else:
             await download_file(
@@ -86,35 +97,101 @@ async def fast_download(client, msg, reply = None, download_folder = None, progr
             )
     return download_location
 
-async def fast_upload(client, file_location, reply=None, name=None, progress_bar_function = progress_bar_str):
+async def fast_upload(client, file_location, reply=None, name=None, progress_bar_function = progress_bar_str, progress_hook = None, source_id = None):
+    # file_location is a path, or an open binary file such as a FileSlice (closed afterwards)
+    # progress_hook(done, total), if given, replaces the Timer-throttled reply.edit progress
+    # source_id names where the bytes came from (e.g. a file_unique_id), so a retry that
+    # downloaded the file again still resumes the upload
     timer = Timer()
+    is_path = isinstance(file_location, str)
     if name == None:
-        name = file_location.split("/")[-1]
+        name = (file_location if is_path else file_location.name).split("/")[-1]
     async def progress_bar(downloaded_bytes, total_bytes):
         if timer.can_send():
             data = progress_bar_function(downloaded_bytes, total_bytes)
             await reply.edit(f"{data}")
-    if reply != None:
-        with open(file_location, "rb") as f:
-            the_file = await upload_file(
-                client=client,
-                file=f,
-                name=name,
-                progress_callback=progress_bar
-            )
-    else:
-        with open(file_location, "rb") as f:
-            the_file = await upload_file(
-                client=client,
-                file=f,
-                name=name,
-            )
+    with (open(file_location, "rb") if is_path else file_location) as f:
+        the_file = await upload_file(
+            client=client,
+            file=f,
+            name=name,
+            progress_callback=progress_hook or (progress_bar if reply != None else None),
+            source_id=source_id
+        )
     return the_file
 
-filename = ""
+class FileSlice(io.RawIOBase):
+    """Read-only file over ``length`` bytes of ``path`` starting at ``offset``.
+
+    Lets one large file be uploaded as several documents without writing chunk files.
+    """
+
+    def __init__(self, path: str, offset: int, length: int, name: Optional[str] = None) -> None:
+        super().__init__()
+        self.path = path
+        self.offset = offset
+        self.length = max(0, min(length, os.path.getsize(path) - offset))
+        self.name = name or path
+        self._file = open(path, "rb")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self.length
+        self._pos = max(0, pos)
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self.length - self._pos
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        self._file.seek(self.offset + self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+async def fast_stream_upload(client, chunks, file_size, name, reply=None, progress_bar_function = progress_bar_str, progress_hook = None):
+    timer = Timer()
+    async def progress_bar(uploaded_bytes, total_bytes):
+        if timer.can_send():
+            data = progress_bar_function(uploaded_bytes, total_bytes)
+            await reply.edit(f"{data}")
+    return await stream_upload(
+        client=client,
+        chunks=chunks,
+        file_size=file_size,
+        name=name,
+        progress_callback=progress_hook or (progress_bar if reply != None else None)
+    )
 
 log: logging.Logger = logging.getLogger("FastTelethon")
 
+# Coroutine function ``offload(func, *args)`` that runs CPU-bound helpers such as md5_range;
+# a worker thread when unset. The bot points it at its media process pool.
+offload: Optional[Callable[..., Awaitable]] = None
+
 TypeLocation = Union[
     Document,
     InputDocumentFileLocation,
@@ -127,31 +204,24 @@ class DownloadSender:
     client: TelegramClient
     sender: MTProtoSender
     request: GetFileRequest
-    remaining: int
-    stride: int
 
     def __init__(
         self,
         client: TelegramClient,
         sender: MTProtoSender,
         file: TypeLocation,
-        offset: int,
         limit: int,
-        stride: int,
-        count: int,
     ) -> None:
         self.sender = sender
         self.client = client
-        self.request = GetFileRequest(file, offset=offset, limit=limit)
-        self.stride = stride
-        self.remaining = count
-
-    async def next(self) -> Optional[bytes]:
-        if not self.remaining:
-            return None
-        result = await self.client._call(self.sender, self.request)
-        self.remaining -= 1
-        self.request.offset += self.stride
+        self.request = GetFileRequest(file, offset=0, limit=limit)
+
+    async def fetch(self, offset: int) -> bytes:
+        # Each sender has a single worker, so reusing the request object is safe
+        self.request.offset = offset
+        # Floods must reach the download worker so its TransferTuner can drop connections,
+        # rather than being slept through inside the client (or a flood scheduler wrapping it)
+        result = await self.client._call(self.sender, self.request, flood_sleep_threshold=0)
         return result.bytes
 
     def disconnect(self) -> Awaitable[None]:
@@ -177,9 +247,11 @@ class UploadSender:
         index: int,
         stride: int,
         loop: asyncio.AbstractEventLoop,
+        on_part: Optional[Callable[[int], None]] = None,
     ) -> None:
         self.client = client
         self.sender = sender
+        self.on_part = on_part
         self.part_count = part_count
         if big:
             self.request = SaveBigFilePartRequest(file_id, index, part_count, b"")
@@ -190,144 +262,477 @@ class UploadSender:
         self.loop = loop
         self.upload_ticker = 0
 
-    async def next(self, data: bytes) -> None:
+    async def next(self, data: bytes, index: Optional[int] = None) -> None:
         if self.previous:
             await self.previous
-        self.previous = self.loop.create_task(self._next(data))
+        self.previous = self.loop.create_task(self._next(data, index))
 
-    async def _next(self, data: bytes) -> None:
+    async def _next(self, data: bytes, index: Optional[int]) -> None:
+        if index is not None:
+            self.request.file_part = index
         self.request.bytes = data
         await self.client._call(self.sender, self.request)
+        if self.on_part:
+            self.on_part(self.request.file_part)
         self.request.file_part += self.stride
 
+    async def wait(self) -> None:
+        """Wait for the part still in flight, raising its error if it failed."""
+        if self.previous:
+            await self.previous
+
     def disconnect(self) -> Awaitable[None]:
         return self.sender.disconnect()
 
+class TransferTuner:
+    """Adjusts the number of download connections while a transfer runs.
+
+    Throughput is sampled every ``SAMPLE_INTERVAL`` seconds: a connection is added
+    while that keeps improving throughput, one is dropped when throughput falls off,
+    and FloodWait halves the count. What worked is remembered per DC and used as the
+    starting point for the next transfer there.
+    """
+
+    MIN_CONNECTIONS = 2
+    MAX_CONNECTIONS = 20
+    SAMPLE_INTERVAL = 2.0
+    # Parts slower than this on average mean the DC is struggling with big requests
+    SLOW_PART_SECONDS = 3.0
+    FAST_PART_SECONDS = 1.0
+    # dc_id -> {"connections": Optional[int], "part_size_kb": Optional[int]}
+    profiles: Dict[int, Dict[str, Optional[int]]] = {}
+
+    def __init__(self, dc_id: int, max_connections: int, fixed: bool = False) -> None:
+        self.dc_id = dc_id
+        self.max_connections = max_connections
+        self.fixed = fixed
+        self.min_connections = min(self.MIN_CONNECTIONS, max_connections)
+        profile = self.profiles.get(dc_id)
+        if fixed or not profile or not profile["connections"]:
+            self.target = max_connections
+        else:
+            self.target = max(self.min_connections, min(max_connections, profile["connections"]))
+        self.errors = 0
+        self.flood_waits = 0
+        self._parts = 0
+        self._latency = 0.0
+        self._best_rate = 0.0
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+
+    @classmethod
+    def part_size_for(cls, dc_id: int, file_size: int) -> int:
+        profile = cls.profiles.get(dc_id)
+        # Large files on a DC that answered quickly last time get 1 MiB parts (half the requests)
+        if profile and profile["part_size_kb"] and file_size > 100 * 1024 * 1024:
+            return profile["part_size_kb"]
+        return utils.get_appropriated_part_size(file_size)
+
+    def part_size_kb(self, file_size: int) -> int:
+        if self.fixed:
+            return utils.get_appropriated_part_size(file_size)
+        return self.part_size_for(self.dc_id, file_size)
+
+    def on_part(self, size: int, seconds: float) -> None:
+        self._parts += 1
+        self._latency += seconds
+        self._window_bytes += size
+
+    def on_flood_wait(self, seconds: int) -> None:
+        self.flood_waits += 1
+        if not self.fixed:
+            self.target = max(self.min_connections, self.target // 2)
+        log.warning(f"FloodWait of {seconds}s on DC {self.dc_id}, using {self.target} connections")
+        self._best_rate = 0.0
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+
+    def on_error(self) -> None:
+        self.errors += 1
+
+    def sample(self) -> int:
+        """Return how many connections to add now (a drop is signalled through ``target``)."""
+        elapsed = time.monotonic() - self._window_start
+        if self.fixed or elapsed < self.SAMPLE_INTERVAL:
+            return 0
+        rate = self._window_bytes / elapsed
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+        if rate > self._best_rate * 1.05:
+            self._best_rate = rate
+            if self.target < self.max_connections:
+                self.target += 1
+                return 1
+        elif rate < self._best_rate * 0.8 and self.target > self.min_connections:
+            self.target -= 1
+        return 0
+
+    def finish(self) -> None:
+        """Store the settings this transfer settled on for the next one on the same DC."""
+        if self.fixed or not self._parts:
+            return
+        profile = self.profiles.setdefault(self.dc_id, {"connections": None, "part_size_kb": None})
+        # Small files never get to use many connections, so only full-size transfers set the count
+        if self.errors:
+            if profile["connections"]:
+                profile["connections"] = min(profile["connections"], self.target)
+        elif self.flood_waits or self.max_connections >= (profile["connections"] or self.MAX_CONNECTIONS):
+            profile["connections"] = self.target
+        mean_latency = self._latency / self._parts
+        if self.flood_waits or self.errors or mean_latency > self.SLOW_PART_SECONDS:
+            profile["part_size_kb"] = None
+        elif mean_latency < self.FAST_PART_SECONDS:
+            profile["part_size_kb"] = 1024
+
 class ParallelTransferrer:
     client: TelegramClient
     loop: asyncio.AbstractEventLoop
     dc_id: int
     senders: Optional[List[Union[DownloadSender, UploadSender]]]
-    auth_key: AuthKey
     upload_ticker: int
 
     def __init__(self, client: TelegramClient, dc_id: Optional[int] = None) -> None:
         self.client = client
         self.loop = self.client.loop
         self.dc_id = dc_id or self.client.session.dc_id
-        self.auth_key = (None if dc_id and self.client.session.dc_id != dc_id
-                        else self.client.session.auth_key)
         self.senders = None
         self.upload_ticker = 0
 
-    async def _cleanup(self) -> None:
-        await asyncio.gather(*[sender.disconnect() for sender in self.senders])
-        self.senders = None
+    async def _cleanup(self, reuse: bool = True) -> None:
+        # Connections go back to the shared pool instead of being closed
+        senders, self.senders = self.senders or [], None
+        await asyncio.gather(*[SenderPool.release(self.client, self.dc_id, sender.sender, reuse)
+                               for sender in senders])
 
     @staticmethod
-    def _get_connection_count(file_size: int, max_count: int = 20,
+    def _get_connection_count(file_size: int, max_count: int = TransferTuner.MAX_CONNECTIONS,
                             full_size: int = 100 * 1024 * 1024) -> int:
         if file_size > full_size:
             return max_count
         return math.ceil((file_size / full_size) * max_count)
 
+    async def _acquire_senders(self, connections: int) -> List[MTProtoSender]:
+        # The first sender waits for the pool (and exports the authorization for a
+        # foreign DC); the rest only take what the global cap allows right now.
+        senders = [await SenderPool.acquire(self.client, self.dc_id)]
+        extra = await asyncio.gather(*[
+            SenderPool.acquire(self.client, self.dc_id, wait=False)
+            for _ in range(1, connections)
+        ], return_exceptions=True)
+        for sender in extra:
+            if isinstance(sender, BaseException):
+                log.warning(f"Could not open a connection to DC {self.dc_id}: {sender}")
+            elif sender is not None:
+                senders.append(sender)
+        return senders
+
     async def _init_download(self, connections: int, file: TypeLocation,
-                           part_count: int, part_size: int) -> None:
-        minimum, remainder = divmod(part_count, connections)
-
-        def get_part_count() -> int:
-            nonlocal remainder
-            if remainder > 0:
-                remainder -= 1
-                return minimum + 1
-            return minimum
-
-        # The first cross-DC sender will export+import the authorization, so we always create it
-        # before creating any other senders.
-        self.senders = [
-            await self._create_download_sender(file, 0, part_size, connections * part_size,
-                                             get_part_count()),
-            *await asyncio.gather(*[
-                self._create_download_sender(file, i, part_size, connections * part_size,
-                                          get_part_count())
-                for i in range(1, connections)
-            ])
-        ]
-
-    async def _create_download_sender(self, file: TypeLocation, index: int,
-                                    part_size: int, stride: int,
-                                    part_count: int) -> DownloadSender:
-        return DownloadSender(self.client, await self._create_sender(), file,
-                            index * part_size, part_size, stride, part_count)
+                           part_size: int) -> None:
+        self.senders = [DownloadSender(self.client, sender, file, part_size)
+                        for sender in await self._acquire_senders(connections)]
+
+    async def _create_download_sender(self, file: TypeLocation,
+                                    part_size: int) -> Optional[DownloadSender]:
+        sender = await SenderPool.acquire(self.client, self.dc_id, wait=False)
+        return DownloadSender(self.client, sender, file, part_size) if sender else None
 
     async def _init_upload(self, connections: int, file_id: int,
-                         part_count: int, big: bool) -> None:
-        self.senders = [
-            await self._create_upload_sender(file_id, part_count, big, 0, connections),
-            *await asyncio.gather(*[
-                self._create_upload_sender(file_id, part_count, big, i, connections)
-                for i in range(1, connections)
-            ])
-        ]
-
-    async def _create_upload_sender(self, file_id: int, part_count: int, big: bool,
-                                  index: int, stride: int) -> UploadSender:
-        return UploadSender(self.client, await self._create_sender(), file_id,
-                          part_count, big, index, stride, self.loop)
-
-    async def _create_sender(self) -> MTProtoSender:
-        dc = await self.client._get_dc(self.dc_id)
-        sender = MTProtoSender(self.auth_key, self.loop, loggers=self.client._log)
-        await sender.connect(self.client._connection(dc.ip_address, dc.port, dc.id,
-                                                  loop=self.loop, loggers=self.client._log,
-                                                  proxy=self.client._proxy))
-        if not self.auth_key:
-            auth = await self.client(_export_session_file(self.dc_id))
-            req = self.client._init_with_layer(auth)
-            await sender.send(req)
-            self.auth_key = sender.auth_key
-        return sender
+                         part_count: int, big: bool,
+                         on_part: Optional[Callable[[int], None]] = None) -> None:
+        senders = await self._acquire_senders(connections)
+        self.senders = [UploadSender(self.client, sender, file_id, part_count, big,
+                                     index, len(senders), self.loop, on_part)
+                        for index, sender in enumerate(senders)]
 
     async def init_upload(self, file_id: int, file_size: int,
                          part_size_kb: Optional[float] = None,
-                         connection_count: Optional[int] = None) -> Tuple[int, int, bool]:
+                         connection_count: Optional[int] = None,
+                         on_part: Optional[Callable[[int], None]] = None) -> Tuple[int, int, bool]:
+        """Open the upload senders. ``on_part`` is called with each part index Telegram accepted."""
         connection_count = connection_count or self._get_connection_count(file_size)
         part_size = (part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024
         part_count = (file_size + part_size - 1) // part_size
         is_large = file_size > 10 * 1024 * 1024
-        await self._init_upload(connection_count, file_id, part_count, is_large)
+        await self._init_upload(connection_count, file_id, part_count, is_large, on_part)
         return part_size, part_count, is_large
 
-    async def upload(self, part: bytes) -> None:
-        await self.senders[self.upload_ticker].next(part)
+    async def upload(self, part: bytes, index: Optional[int] = None) -> None:
+        """Upload the next part, or part ``index`` when parts are sent out of sequence."""
+        await self.senders[self.upload_ticker].next(part, index)
         self.upload_ticker = (self.upload_ticker + 1) % len(self.senders)
 
     async def finish_upload(self) -> None:
+        try:
+            # The last part of every sender may still be in flight
+            await asyncio.gather(*[sender.wait() for sender in self.senders])
+        except BaseException:
+            await self._cleanup(reuse=False)
+            raise
         await self._cleanup()
 
+    async def download_parts(self, file: TypeLocation, file_size: int,
+                            part_size_kb: Optional[float] = None,
+                            connection_count: Optional[int] = None,
+                            in_order: bool = False,
+                            skip_parts: Optional[Set[int]] = None) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """Yield ``(offset, data)`` for every part of the file.
+
+        Each sender claims the next unfetched part as soon as it is free, so a slow
+        connection only delays its own part instead of the whole round. At most
+        ``2 * connections`` parts are fetched ahead of the consumer; with ``in_order``
+        they are reassembled in that window before being yielded.
+
+        Unless ``connection_count`` is given, a ``TransferTuner`` picks the starting
+        connection count and part size for this DC and adjusts the connection count
+        while the download runs. Part indices in ``skip_parts`` are not fetched.
+        """
+        tuner = TransferTuner(self.dc_id, connection_count or self._get_connection_count(file_size),
+                              fixed=connection_count is not None)
+        part_size = (part_size_kb or tuner.part_size_kb(file_size)) * 1024
+        pending = [index for index in range(math.ceil(file_size / part_size))
+                   if not skip_parts or index not in skip_parts]
+        part_count = len(pending)
+        if not part_count:
+            return
+        await self._init_download(tuner.target, file, part_size)
+        # The pool may have handed out fewer connections than asked for
+        tuner.target = min(tuner.target, len(self.senders))
+
+        # claimed/released/done count positions in `pending`, not part indices
+        cond = asyncio.Condition()
+        claimed = 0    # next position to hand to a sender
+        released = 0   # positions handed to the consumer
+        done = {}      # position -> data, waiting for the consumer
+        active = 0     # workers currently running
+        error = None
+
+        def can_claim() -> bool:
+            return claimed >= part_count or active > tuner.target or claimed < released + 2 * tuner.target
+
+        async def worker(sender: DownloadSender) -> None:
+            nonlocal claimed, active, error
+            active += 1
+            try:
+                while True:
+                    async with cond:
+                        await cond.wait_for(can_claim)
+                        # Retire when there is nothing left or the tuner dropped a connection
+                        if claimed >= part_count or active > tuner.target:
+                            return
+                        position = claimed
+                        claimed += 1
+                    while True:
+                        started = time.monotonic()
+                        try:
+                            data = await sender.fetch(pending[position] * part_size)
+                            break
+                        except FloodWaitError as e:
+                            tuner.on_flood_wait(e.seconds)
+                            await asyncio.sleep(e.seconds)
+                    tuner.on_part(len(data), time.monotonic() - started)
+                    async with cond:
+                        done[position] = data
+                        cond.notify_all()
+            except Exception as e:
+                if isinstance(e, (FileReferenceExpiredError, FileReferenceInvalidError)):
+                    tuner.on_error()
+                async with cond:
+                    error = error or e
+                    cond.notify_all()
+            finally:
+                active -= 1
+
+        async def add_worker() -> None:
+            try:
+                sender = await self._create_download_sender(file, part_size)
+            except Exception as e:
+                log.warning(f"Could not open another connection to DC {self.dc_id}: {e}")
+                sender = None
+            if sender is None:
+                tuner.target = max(tuner.min_connections, tuner.target - 1)
+                return
+            self.senders.append(sender)
+            await worker(sender)
+
+        workers = [self.loop.create_task(worker(sender)) for sender in self.senders]
+        finished = False
+        try:
+            while released < part_count:
+                for _ in range(tuner.sample()):
+                    workers.append(self.loop.create_task(add_worker()))
+                async with cond:
+                    if in_order:
+                        await cond.wait_for(lambda: error or released in done)
+                    else:
+                        await cond.wait_for(lambda: error or done)
+                    if error:
+                        raise error
+                    position = released if in_order else next(iter(done))
+                    data = done.pop(position)
+                    released += 1
+                    cond.notify_all()
+                if data:
+                    yield pending[position] * part_size, data
+            tuner.finish()
+            finished = True
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Connections cut off mid-request are not trusted for the next transfer
+            await self._cleanup(reuse=finished)
+
     async def download(self, file: TypeLocation, file_size: int,
                       part_size_kb: Optional[float] = None,
                       connection_count: Optional[int] = None) -> AsyncGenerator[bytes, None]:
-        connection_count = connection_count or self._get_connection_count(file_size)
-        part_size = (part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024
-        part_count = math.ceil(file_size / part_size)
-        await self._init_download(connection_count, file, part_count, part_size)
-
-        part = 0
-        while part < part_count:
-            tasks = []
-            for sender in self.senders:
-                tasks.append(self.loop.create_task(sender.next()))
-            for task in tasks:
-                data = await task
-                if not data:
-                    break
-                yield data
-                part += 1
-        await self._cleanup()
+        async for _, data in self.download_parts(file, file_size, part_size_kb,
+                                                 connection_count, in_order=True):
+            yield data
 
 parallel_transfer_locks: DefaultDict[int, asyncio.Lock] = defaultdict(lambda: asyncio.Lock())
 
+class SenderPool:
+    """Authorized MTProto connections kept open between transfers, per client and DC.
+
+    Opening a connection (and, for a foreign DC, exporting the authorization) costs
+    more than moving a small file, so senders are handed back here after a transfer
+    and reused until they have been idle for ``IDLE_TIMEOUT`` seconds.
+    ``MAX_SENDERS`` caps the connections open across all DCs.
+    """
+
+    MAX_SENDERS = 40
+    IDLE_TIMEOUT = 120
+    # (client, dc_id) -> [(sender, released_at)]
+    _idle: DefaultDict[Tuple[TelegramClient, int], List[Tuple[MTProtoSender, float]]] = defaultdict(list)
+    # (client, dc_id) -> auth key created by importing the exported authorization
+    _auth_keys: Dict[Tuple[TelegramClient, int], AuthKey] = {}
+    # Senders open right now, idle or in use
+    _open = 0
+    _cond: Optional[asyncio.Condition] = None
+
+    @classmethod
+    def _condition(cls) -> asyncio.Condition:
+        if cls._cond is None:
+            cls._cond = asyncio.Condition()
+        return cls._cond
+
+    @classmethod
+    def _pop_expired(cls) -> List[MTProtoSender]:
+        """Remove idle senders past IDLE_TIMEOUT or no longer connected. Caller holds the lock."""
+        cutoff = time.monotonic() - cls.IDLE_TIMEOUT
+        expired = []
+        for idle in cls._idle.values():
+            for entry in list(idle):
+                sender, released_at = entry
+                if released_at < cutoff or not sender.is_connected():
+                    idle.remove(entry)
+                    expired.append(sender)
+        cls._open -= len(expired)
+        return expired
+
+    @classmethod
+    def _pop_oldest_idle(cls) -> Optional[MTProtoSender]:
+        oldest = min(((t, key) for key, idle in cls._idle.items() for _, t in idle[:1]), default=None)
+        if oldest is None:
+            return None
+        sender, _ = cls._idle[oldest[1]].pop(0)
+        cls._open -= 1
+        return sender
+
+    @staticmethod
+    async def _close(senders: List[MTProtoSender]) -> None:
+        await asyncio.gather(*[sender.disconnect() for sender in senders], return_exceptions=True)
+
+    @classmethod
+    async def acquire(cls, client: TelegramClient, dc_id: int,
+                      wait: bool = True) -> Optional[MTProtoSender]:
+        """Return a connected sender for ``dc_id``.
+
+        When the global cap is reached an idle sender of another DC is closed to make
+        room; if every sender is busy this waits, or returns None when ``wait`` is False.
+        """
+        key = (client, dc_id)
+        cond = cls._condition()
+        to_close = []
+        reused = None
+        opening = False
+        async with cond:
+            while True:
+                to_close.extend(cls._pop_expired())
+                idle = cls._idle[key]
+                if idle:
+                    reused, _ = idle.pop()
+                    break
+                if cls._open < cls.MAX_SENDERS:
+                    cls._open += 1
+                    opening = True
+                    break
+                victim = cls._pop_oldest_idle()
+                if victim:
+                    to_close.append(victim)
+                    continue
+                if not wait:
+                    break
+                await cond.wait()
+        await cls._close(to_close)
+        if not opening:
+            return reused
+        try:
+            return await cls._connect(client, dc_id)
+        except BaseException:
+            async with cond:
+                cls._open -= 1
+                cond.notify_all()
+            raise
+
+    @classmethod
+    async def _connect(cls, client: TelegramClient, dc_id: int) -> MTProtoSender:
+        key = (client, dc_id)
+        if dc_id == client.session.dc_id:
+            return await cls._open_sender(client, dc_id, client.session.auth_key)
+        if key in cls._auth_keys:
+            return await cls._open_sender(client, dc_id, cls._auth_keys[key])
+        # Only one transfer exports the authorization to a DC, the rest wait and reuse its key
+        async with parallel_transfer_locks[dc_id]:
+            if key in cls._auth_keys:
+                return await cls._open_sender(client, dc_id, cls._auth_keys[key])
+            sender = await cls._open_sender(client, dc_id, None)
+            try:
+                auth = await client(ExportAuthorizationRequest(dc_id))
+                client._init_request.query = ImportAuthorizationRequest(id=auth.id, bytes=auth.bytes)
+                await sender.send(InvokeWithLayerRequest(LAYER, client._init_request))
+            except BaseException:
+                await sender.disconnect()
+                raise
+            cls._auth_keys[key] = sender.auth_key
+            return sender
+
+    @staticmethod
+    async def _open_sender(client: TelegramClient, dc_id: int,
+                           auth_key: Optional[AuthKey]) -> MTProtoSender:
+        dc = await client._get_dc(dc_id)
+        sender = MTProtoSender(auth_key, loggers=client._log)
+        await sender.connect(client._connection(dc.ip_address, dc.port, dc.id,
+                                                loggers=client._log,
+                                                proxy=client._proxy,
+                                                local_addr=client._local_addr))
+        return sender
+
+    @classmethod
+    async def release(cls, client: TelegramClient, dc_id: int, sender: MTProtoSender,
+                      reuse: bool = True) -> None:
+        """Hand a sender back; it is closed instead when ``reuse`` is False or it lost its connection."""
+        cond = cls._condition()
+        async with cond:
+            keep = reuse and sender.is_connected()
+            if keep:
+                cls._idle[(client, dc_id)].append((sender, time.monotonic()))
+            else:
+                cls._open -= 1
+            cond.notify_all()
+        if not keep:
+            await cls._close([sender])
+
 def stream_file(file_to_stream: BinaryIO, chunk_size=1024):
     while True:
         data_read = file_to_stream.read(chunk_size)
@@ -335,45 +740,152 @@ def stream_file(file_to_stream: BinaryIO, chunk_size=1024):
             break
         yield data_read
 
+def read_parts(file_to_read: BinaryIO, part_size: int):
+    # One read call per upload part. Large reads on a buffered file go straight into
+    # the returned bytes object, which is what the upload request needs anyway
+    # (telethon only serializes bytes, so a memoryview would cost another copy).
+    while True:
+        part = file_to_read.read(part_size)
+        if not part:
+            break
+        yield part
+
+def md5_range(path: str, offset: int, length: int) -> str:
+    """MD5 of ``length`` bytes of ``path`` starting at ``offset``. Runs outside the event loop."""
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            hash_md5.update(chunk)
+            remaining -= len(chunk)
+    return hash_md5.hexdigest()
+
+async def _offload(func, *args):
+    if offload is not None:
+        return await offload(func, *args)
+    return await asyncio.to_thread(func, *args)
+
+async def _report_progress(progress_callback: callable, current: int, total: int) -> None:
+    if progress_callback:
+        r = progress_callback(current, total)
+        if inspect.isawaitable(r):
+            try:
+                await r
+            except BaseException:
+                pass
+
 async def _internal_transfer_to_telegram(client: TelegramClient,
                                        response: BinaryIO,
-                                       progress_callback: callable) -> Tuple[TypeInputFile, int]:
-    file_id = helpers.generate_random_long()
-    file_size = os.path.getsize(response.name)
+                                       filename: str,
+                                       progress_callback: callable,
+                                       source_id: Optional[str] = None) -> Tuple[TypeInputFile, int]:
+    # A FileSlice uploads only its own byte range of the underlying file
+    path = getattr(response, "path", response.name)
+    offset = getattr(response, "offset", 0)
+    file_size = response.length if isinstance(response, FileSlice) else os.path.getsize(path)
+    # Without a known source only the modification time tells a rewritten file apart
+    identity = source_id or os.stat(path).st_mtime_ns
+    journal = PartJournal(f"upload:{os.path.abspath(path)}:{offset}:{file_size}:{identity}:{filename}")
+    # Telegram only keeps uploaded parts for a limited time, so old journals start over
+    header = journal.resume({"size": file_size}, max_age=UPLOAD_RESUME_SECONDS)
+    if header:
+        file_id = header["file_id"]
+        log.info(f"Resuming upload of {response.name}: {len(journal.done)} parts already sent")
+    else:
+        file_id = helpers.generate_random_long()
 
+    uploader = ParallelTransferrer(client)
+    part_size, part_count, is_large = await uploader.init_upload(file_id, file_size, on_part=journal.commit)
+    if not header:
+        journal.start({"size": file_size, "file_id": file_id, "part_count": part_count})
+    # Telegram only checks the MD5 of small files; hash the whole range in one go while the parts upload
+    md5_task = None if is_large else asyncio.ensure_future(_offload(md5_range, path, offset, file_size))
+    try:
+        try:
+            for index in range(part_count):
+                if index not in journal.done:
+                    # Parts Telegram already has are never read again; the MD5 is taken from the file itself
+                    response.seek(index * part_size)
+                    await uploader.upload(response.read(part_size), index)
+                await _report_progress(progress_callback, min(file_size, (index + 1) * part_size), file_size)
+        finally:
+            await uploader.finish_upload()
+    except BaseException:
+        if md5_task:
+            md5_task.cancel()
+        journal.close()
+        raise
+    journal.discard()
+    if is_large:
+        return InputFileBig(file_id, part_count, filename), file_size
+    else:
+        return InputFile(file_id, part_count, filename, await md5_task), file_size
+
+async def _internal_stream_to_telegram(client: TelegramClient,
+                                      chunks: AsyncIterator[bytes],
+                                      file_size: int,
+                                      name: str,
+                                      progress_callback: callable,
+                                      max_buffered: int = 8) -> Tuple[TypeInputFile, int]:
+    # Chunks arrive from the download side while parts are still being uploaded;
+    # the bounded queue keeps at most `max_buffered` chunks in memory at once.
+    file_id = helpers.generate_random_long()
     hash_md5 = hashlib.md5()
     uploader = ParallelTransferrer(client)
     part_size, part_count, is_large = await uploader.init_upload(file_id, file_size)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+
+    async def produce() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception:
+            # Still wake the consumer up; awaiting the producer re-raises the error.
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    producer = client.loop.create_task(produce())
     buffer = bytearray()
-    for data in stream_file(response):
-        if progress_callback:
-            r = progress_callback(response.tell(), file_size)
-            if inspect.isawaitable(r):
-                try:
-                    await r
-                except BaseException:
-                    pass
-        if not is_large:
-            hash_md5.update(data)
-        if len(buffer) == 0 and len(data) == part_size:
-            await uploader.upload(data)
-            continue
-        new_len = len(buffer) + len(data)
-        if new_len >= part_size:
-            cutoff = part_size - len(buffer)
-            buffer.extend(data[:cutoff])
+    uploaded = 0
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            if not is_large:
+                await asyncio.to_thread(hash_md5.update, chunk)
+            if not buffer and len(chunk) == part_size:
+                await uploader.upload(bytes(chunk))
+                uploaded += part_size
+                await _report_progress(progress_callback, uploaded, file_size)
+                continue
+            buffer.extend(chunk)
+            while len(buffer) >= part_size:
+                # Copy the part out through a view, slicing the bytearray would copy twice
+                with memoryview(buffer) as view:
+                    part = bytes(view[:part_size])
+                del buffer[:part_size]
+                await uploader.upload(part)
+                uploaded += part_size
+                await _report_progress(progress_callback, uploaded, file_size)
+        await producer
+        if len(buffer) > 0:
             await uploader.upload(bytes(buffer))
-            buffer.clear()
-            buffer.extend(data[cutoff:])
-        else:
-            buffer.extend(data)
-    if len(buffer) > 0:
-        await uploader.upload(bytes(buffer))
-    await uploader.finish_upload()
+            uploaded += len(buffer)
+        if uploaded != file_size:
+            raise ValueError(f"Stream ended after {uploaded} of {file_size} bytes")
+    finally:
+        producer.cancel()
+        await uploader.finish_upload()
     if is_large:
-        return InputFileBig(file_id, part_count, filename), file_size
+        return InputFileBig(file_id, part_count, name), file_size
     else:
-        return InputFile(file_id, part_count, filename, hash_md5.hexdigest()), file_size
+        return InputFile(file_id, part_count, name, hash_md5.hexdigest()), file_size
 
 async def download_file(client: TelegramClient,
                        location: TypeLocation,
@@ -383,22 +895,63 @@ async def download_file(client: TelegramClient,
     dc_id, location = utils.get_input_location(location)
     # We lock the transfers because telegram has connection count limits
     downloader = ParallelTransferrer(client, dc_id)
-    downloaded = downloader.download(location, size)
-    async for x in downloaded:
-        out.write(x)
-        if progress_callback:
-            r = progress_callback(out.tell(), size)
-            if inspect.isawaitable(r):
-                try:
-                    await r
-                except BaseException:
-                    pass
+    try:
+        fd = out.fileno() if hasattr(os, "pwrite") else None
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fd = None
+    if fd is None:
+        async for x in downloader.download(location, size):
+            out.write(x)
+            await _report_progress(progress_callback, out.tell(), size)
+        return out
+
+    # Real files take parts in whatever order they arrive, written at their own offset
+    out.flush()
+    start = out.tell()
+    journal = None
+    part_size_kb = None
+    written = 0
+    if start == 0 and getattr(out, "name", None):
+        # Parts already in the file from an interrupted attempt are not fetched again
+        journal = PartJournal(_download_journal_key(location, size, out.name))
+        header = journal.resume({"size": size, "dc_id": dc_id}) if os.fstat(fd).st_size else None
+        if header:
+            part_size_kb = header["part_size_kb"]
+            written = sum(min(part_size_kb * 1024, size - index * part_size_kb * 1024) for index in journal.done)
+            log.info(f"Resuming download into {out.name}: {len(journal.done)} parts already on disk")
+        else:
+            part_size_kb = TransferTuner.part_size_for(dc_id, size)
+            journal.start({"size": size, "dc_id": dc_id, "part_size_kb": part_size_kb})
+    try:
+        async for offset, data in downloader.download_parts(location, size, part_size_kb,
+                                                            skip_parts=journal.done if journal else None):
+            os.pwrite(fd, data, start + offset)
+            if journal:
+                journal.commit(offset // (part_size_kb * 1024))
+            written += len(data)
+            await _report_progress(progress_callback, written, size)
+    except BaseException:
+        if journal:
+            journal.close()
+        raise
+    if journal:
+        journal.discard()
+    out.seek(start + size)
     return out
 
+def _download_journal_key(location, size: int, path: str) -> str:
+    return f"download:{getattr(location, 'id', '')}:{size}:{os.path.abspath(path)}"
+
 async def upload_file(client: TelegramClient,
                       file: BinaryIO,
                       name,
-                      progress_callback: callable = None) -> TypeInputFile:
-    global filename
-    filename = name
-    return (await _internal_transfer_to_telegram(client, file, progress_callback))[0]
+                      progress_callback: callable = None,
+                      source_id: Optional[str] = None) -> TypeInputFile:
+    return (await _internal_transfer_to_telegram(client, file, name, progress_callback, source_id))[0]
+
+async def stream_upload(client: TelegramClient,
+                        chunks: AsyncIterator[bytes],
+                        file_size: int,
+                        name: str,
+                        progress_callback: callable = None) -> TypeInputFile:
+    return (await _internal_stream_to_telegram(client, chunks, file_size, name, progress_callback))[0]
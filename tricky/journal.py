@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Set, TextIO, Tuple
+
+JOURNAL_DIR = "journals/"
+
+class PartJournal:
+    """Append-only on-disk record of the parts of a transfer that are done.
+
+    The first line holds the transfer's parameters as JSON, every following line the
+    index of one finished part. A retried transfer with the same key and parameters
+    resumes with the recorded parts skipped, including after a restart.
+    """
+
+    def __init__(self, key: str, directory: str = JOURNAL_DIR) -> None:
+        self.path = os.path.join(directory, hashlib.sha1(key.encode()).hexdigest() + ".journal")
+        self.header: Dict[str, Any] = {}
+        self.done: Set[int] = set()
+        self._file: Optional[TextIO] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _read(self) -> Tuple[Optional[Dict[str, Any]], Set[int]]:
+        try:
+            with open(self.path) as f:
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return None, set()
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None, set()
+        done = set()
+        for line in lines[1:]:
+            # A crash can leave the last line half written; it simply was not committed
+            if line.isdigit():
+                done.add(int(line))
+        return header, done
+
+    def resume(self, params: Dict[str, Any], max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Reopen the journal if it was started with the same ``params``. Returns its header or None."""
+        header, done = self._read()
+        if header is None or any(header.get(k) != v for k, v in params.items()):
+            return None
+        if max_age is not None and time.time() - header.get("created", 0) > max_age:
+            return None
+        self.header, self.done = header, done
+        self._file = open(self.path, "a")
+        return header
+
+    def start(self, header: Dict[str, Any]) -> None:
+        """Begin a new journal, replacing any previous one."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.header = dict(header, created=time.time())
+        self.done = set()
+        self._file = open(self.path, "w")
+        self._file.write(json.dumps(self.header) + "\n")
+        self._file.flush()
+
+    def commit(self, part: int) -> None:
+        self.done.add(part)
+        self._file.write(f"{part}\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """Drop the journal once the transfer has finished."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass